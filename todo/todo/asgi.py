@@ -13,4 +13,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'todo.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from todo_app.events import event_stream  # noqa: E402, needs the app registry loaded above
+
+
+# Project event streams are served by a raw ASGI application, everything else by Django
+async def application(scope, receive, send):
+    if event_stream.matches(scope):
+        await event_stream(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'todo_app.middleware.ViewStatsMiddleware',
+    'todo_app.middleware.ReadReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,11 +81,99 @@ WSGI_APPLICATION = 'todo.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # Django's SQLite backend, opening write transactions with BEGIN IMMEDIATE so they wait for the write
+        # lock for busy_timeout ms instead of failing when it is taken (see todo_app/backends/sqlite3/base.py)
+        'ENGINE': 'todo_app.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+        # Seconds a connection is kept open between requests, checked before it is reused
+        'CONN_MAX_AGE': int(os.environ.get('TODO_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        # Tests run on a database file, the shared in-memory database fails concurrent writers with "table is
+        # locked" instead of making them wait
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Read replicas the reads of GET requests are sent to, the primary is 'default'. Locally TODO_READ_REPLICAS
+# takes a comma separated list of SQLite files standing in for them, refreshed from the primary with
+# `manage.py sync_replicas`. Tests read the replicas through the primary's test database.
+READ_DATABASES = []
+for number, name in enumerate(filter(None, os.environ.get('TODO_READ_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{number}'] = dict(DATABASES['default'], NAME=BASE_DIR / name.strip(), TEST={'MIRROR': 'default'})
+    READ_DATABASES.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['todo_app.routers.ReadReplicaRouter']
+
+# Seconds a client that wrote keeps reading from the primary, so it reads its own writes while the replicas
+# catch up. Clients are told apart by their Authorization header or session cookie.
+READ_YOUR_WRITES_SECONDS = 5
+
+# PRAGMAs run on every new SQLite connection by todo_app.signals: write-ahead log so readers do not block
+# the writer, fsync at checkpoints only, wait up to busy_timeout ms for a lock instead of failing, and a 64 MB
+# page cache and 256 MB memory map per connection. Set to {} to keep SQLite's defaults.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'temp_store': 'memory',
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Serialized project responses, use a shared backend (e.g. Redis) when running several processes
+    'projects': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'project-responses',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+PROJECT_RESPONSE_CACHE = 'projects'
+PROJECT_RESPONSE_CACHE_TIMEOUT = 3600
+
+
+# Logging, level of the app loggers can be set with the TODO_LOG_LEVEL environment variable
+# https://docs.djangoproject.com/en/4.1/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {
+            'format': '{asctime} {levelname} {name} {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'simple',
+        },
+    },
+    'loggers': {
+        'todo_app': {
+            'handlers': ['console'],
+            'level': os.environ.get('TODO_LOG_LEVEL', 'WARNING'),
+        },
+        'user_app': {
+            'handlers': ['console'],
+            'level': os.environ.get('TODO_LOG_LEVEL', 'WARNING'),
+        },
+    },
+}
+
+# Requests slower than this many milliseconds are logged by ViewStatsMiddleware
+VIEW_STATS_SLOW_MS = 500
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -137,6 +228,88 @@ REST_FRAMEWORK = {
     # ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication'
+        'user_app.authentication.CachedTokenAuthentication'
     ],
+
+    # orjson backed JSON, falls back to DRF's JSON renderer and parser when orjson is not installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'todo_app.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'todo_app.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+
+    # Sliding-window throttles (todo_app/throttling.py): a budget per user or anonymous address, and budgets
+    # of their own for the expensive views, set by their throttle_scope
+    'DEFAULT_THROTTLE_CLASSES': [
+        'todo_app.throttling.AnonRateThrottle',
+        'todo_app.throttling.UserRateThrottle',
+        'todo_app.throttling.ScopedRateThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': '60/min',
+        'user': '600/min',
+        'project-list': '120/min',  # nested project pages, and project creation
+        'task-update': '120/min',  # task writes and the project progress they change
+        'register': '10/hour',  # per address, each registration hashes a password
+    },
 }
+
+# Throttles on or off (the benchmark turns them off), and the cache alias their windows are kept in: None
+# keeps them in each process, a shared cache (e.g. Redis) makes the limits hold across processes
+THROTTLE_ENABLED = True
+THROTTLE_CACHE = None
+
+# Per-user throttle rates by username and scope, overriding DEFAULT_THROTTLE_RATES. None lifts the limit,
+# e.g. {'reporting-bot': {'user': '5000/min', 'project-list': None}}
+THROTTLE_USER_RATES = {}
+
+# Token authentication cache, number of tokens kept in memory and seconds before a lookup is repeated
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TTL = 300
+
+# Project list pagination, clients may override the page size with ?page_size= up to the maximum
+PROJECT_LIST_PAGE_SIZE = 20
+PROJECT_LIST_MAX_PAGE_SIZE = 100
+
+# Task list keyset pagination page sizes
+TASK_LIST_PAGE_SIZE = 50
+TASK_LIST_MAX_PAGE_SIZE = 500
+
+# Largest number of tasks accepted in one request by the batch task endpoint
+TASK_BATCH_MAX_SIZE = 1000
+
+# Build project and task list responses from values() rows instead of ModelSerializer instances
+FAST_READ_SERIALIZERS = True
+
+# How project rollups are recomputed after task writes: 'sync' in the request, 'thread' by an in-process worker
+# or 'queue' by `manage.py process_rollups`, coalescing the writes of a project within the debounce window
+# (seconds). See todo_app/rollups.py.
+PROJECT_ROLLUP_MODE = os.environ.get('TODO_ROLLUP_MODE', 'sync')
+PROJECT_ROLLUP_DEBOUNCE = 0.5
+
+# Rows read from the database per round trip by the streaming exports
+EXPORT_CHUNK_SIZE = 2000
+
+# Changes feed (/projects/changes/): rows per feed per page, how far the page end trails the current time so
+# writes still committing are not skipped (seconds), and how long deletions are kept (days). Older cursors
+# get 410 Gone, `manage.py prune_tombstones` removes older deletions.
+CHANGES_PAGE_SIZE = 500
+CHANGES_SETTLE_SECONDS = 2
+CHANGES_TOMBSTONE_DAYS = 30
+
+# Completed projects unchanged for this many days are moved to the archive tables by `manage.py archive_projects`
+ARCHIVE_AFTER_DAYS = 90
+
+# Search results page sizes, and the deepest offset served (/projects/search/?q=)
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_MAX_OFFSET = 1000
+
+# Server-sent event streams of project progress (/projects/<pk>/events/, served under ASGI by todo/asgi.py):
+# seconds between keepalive comments, and events buffered per stream before a slow client is told to resync
+EVENTS_KEEPALIVE_SECONDS = 15
+EVENTS_QUEUE_SIZE = 100
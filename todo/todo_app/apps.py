@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TodoAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'todo_app'
+
+    def ready(self):
+        from todo_app import signals  # noqa: F401 connect the response cache receivers
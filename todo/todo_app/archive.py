@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from todo_app.models import Project, Task, AssignedUser, ArchivedProject, ArchivedTask, ArchivedAssignedUser
+
+# Hot model -> archive model, in the order their rows are copied
+ARCHIVE_MODELS = [
+    (Project, ArchivedProject),
+    (Task, ArchivedTask),
+    (AssignedUser, ArchivedAssignedUser),
+]
+
+
+def archivable_projects(days):
+    cutoff = timezone.now() - timedelta(days=days)
+    return Project.objects.filter(project_completed=True, project_updated_at__lt=cutoff)
+
+
+# Columns copied from a hot model to its archive model, the archive models have the same field names
+def copied_columns(archive_model):
+    return [field.attname for field in archive_model._meta.concrete_fields if field.name != 'archived_at']
+
+
+# Move the projects of `project_pks` that are still archivable, with their tasks and assigned users, into the
+# archive tables in one transaction. Deleting them from the hot tables goes through the delete collector, so
+# the response cache is invalidated and the changes feed reports them deleted. Returns the number moved.
+def archive_batch(project_pks, days):
+    with transaction.atomic():
+        # Checked again in the transaction, a project may have been reopened since it was picked
+        projects = archivable_projects(days).filter(pk__in=project_pks).select_for_update()
+        pks = list(projects.values_list('pk', flat=True))
+        if not pks:
+            return 0
+        for model, archive_model in ARCHIVE_MODELS:
+            rows = model.objects.filter(**{'pk__in' if model is Project else 'project__in': pks}).order_by('pk')
+            archive_model.objects.bulk_create([archive_model(**row)
+                                               for row in rows.values(*copied_columns(archive_model))])
+        Project.objects.filter(pk__in=pks).delete()
+    return len(pks)
@@ -0,0 +1,174 @@
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, HttpResponse
+from django.utils.http import parse_etags
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from todo_app import fast_serializer
+from todo_app.cache import response_cache
+from todo_app.conditional import version_etag, aproject_version, atask_project_version
+from todo_app.models import Project, Task, AssignedUser
+from todo_app.pagination import ProjectPagination, TaskKeysetPagination
+from todo_app.permissions import IsOwnerOrReadOnly, IsProjectOwner
+from todo_app.views import sparse_fieldset, task_queryset, user_projects, project_list_scope
+from user_app.authentication import CachedTokenAuthentication
+
+
+# Native async counterpart of the GET of a sync view. Authentication, permission checks, queries and the
+# response cache go through async APIs, so under ASGI a request waiting on them does not hold a thread of
+# the sync bridge. Same permission classes, payload and ETag as the sync view; only JSON is rendered, the
+# browsable API stays on the sync views. Subclasses return the payload from `async def get_data(request)`.
+class AsyncReadView(View):
+    http_method_names = ['get', 'head', 'options']
+    permission_classes = [IsAuthenticated]
+    version_lookup = None  # async (project pk, version) lookup by the url's pk for the ETag, None for no ETag
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    authentication = CachedTokenAuthentication()
+    renderer_class = api_settings.DEFAULT_RENDERER_CLASSES[0]
+
+    async def get(self, request, **kwargs):
+        request = Request(request, authenticators=())
+        etag = None
+        try:
+            await self.initial(request)
+            version = await self.get_project_version(request)
+            if version is not None:
+                etag = version_etag(version, self.renderer_class.format)
+            if etag is not None and etag in parse_etags(request.headers.get('If-None-Match', '')):
+                response = HttpResponse(status=304)
+            else:
+                response = self.render(await self.get_data(request))
+        except Exception as exc:
+            response = self.handle_exception(request, exc)
+        if etag is not None and response.status_code in (200, 304):
+            response['ETag'] = etag
+        return response
+
+    # Django 4.1.0 hands the 405 response of async views to the handler without a coroutine around it
+    def http_method_not_allowed(self, request, *args, **kwargs):
+        response = super().http_method_not_allowed(request, *args, **kwargs)
+
+        async def func():
+            return response
+
+        return func()
+
+    async def initial(self, request):
+        user_auth = await self.authentication.aauthenticate(request)
+        request.user, request.auth = user_auth if user_auth is not None else (AnonymousUser(), None)
+        for permission in [permission() for permission in self.permission_classes]:
+            if hasattr(permission, 'ahas_permission'):
+                allowed = await permission.ahas_permission(request, self)
+            else:  # DRF's own permissions only look at request.user
+                allowed = permission.has_permission(request, self)
+            if not allowed:
+                if user_auth is None:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+        # The throttle windows are kept in memory or a cache, checking them does not touch the database
+        waits = [throttle.wait() for throttle in [throttle() for throttle in self.throttle_classes]
+                 if not throttle.allow_request(request, self)]
+        if waits:
+            raise exceptions.Throttled(max(waits))
+
+    # (project pk, version) the response depends on, None when it is not tagged
+    async def get_project_version(self, request):
+        if self.version_lookup is None:
+            return None
+        return await self.version_lookup(self.kwargs['pk'])
+
+    def render(self, data, status=200, headers=None):
+        renderer = self.renderer_class()
+        response = HttpResponse(renderer.render(data, renderer.media_type), status=status,
+                                content_type=renderer.media_type)
+        response['Vary'] = 'Accept'
+        for name, value in (headers or {}).items():
+            response[name] = value
+        return response
+
+    def handle_exception(self, request, exc):
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            exc.auth_header = self.authentication.authenticate_header(request)
+        response = exception_handler(exc, {'view': self, 'request': request})
+        if response is None:
+            raise exc
+        # Only the headers set by the handler (WWW-Authenticate, Retry-After), not the default content type
+        headers = {name: value for name, value in response.items() if name.lower() != 'content-type'}
+        return self.render(response.data, status=response.status_code, headers=headers)
+
+
+class AsyncProjectList(AsyncReadView):
+    throttle_scope = 'project-list'  # the budget of ProjectList
+
+    async def get_data(self, request):
+        return await response_cache.aget_project_list(request.build_absolute_uri(), lambda: self.list_page(request),
+                                                      scope=project_list_scope(request.user))
+
+    async def list_page(self, request):
+        fields, expand = sparse_fieldset(request)
+        row_serializer = fast_serializer.project_rows(*[None if names is None else tuple(names)
+                                                        for names in (fields, expand)])
+        paginator = ProjectPagination()
+        rows = row_serializer.values(user_projects(request.user).order_by('pk'), 'id')
+        page = await paginator.apaginate_queryset(rows, request)
+        return paginator.get_paginated_response(await fast_serializer.aproject_data(page, row_serializer)).data
+
+
+class AsyncProjectDetail(AsyncReadView):
+    permission_classes = [IsProjectOwner]
+
+    version_lookup = staticmethod(aproject_version)
+
+    async def get_project_version(self, request):
+        self.version = await super().get_project_version(request)
+        return self.version
+
+    async def get_data(self, request):
+        if self.version is None:
+            raise Http404
+        fields, expand = sparse_fieldset(request)
+
+        async def build():
+            row_serializer = fast_serializer.project_rows(*[None if names is None else tuple(names)
+                                                            for names in (fields, expand)])
+            rows = [row async for row in row_serializer.values(Project.objects.filter(pk=self.kwargs['pk']), 'id')]
+            if not rows:
+                raise Http404
+            return (await fast_serializer.aproject_data(rows, row_serializer))[0]
+
+        # Shares the entries of the sync view, both build the same payload
+        return await response_cache.aget_project(*self.version, build, variant=f'{fields}|{expand}')
+
+
+class AsyncTaskList(AsyncReadView):
+    version_lookup = staticmethod(aproject_version)
+
+    async def get_data(self, request):
+        row_serializer = fast_serializer.task_rows()
+        paginator = TaskKeysetPagination()
+        rows = row_serializer.values(task_queryset(self.kwargs['pk'], request.query_params), 'task_due_date', 'id')
+        page = await paginator.apaginate_queryset(rows, request)
+        return paginator.get_paginated_response([row_serializer.to_representation(row) for row in page]).data
+
+
+class AsyncTaskDetail(AsyncReadView):
+    permission_classes = [IsOwnerOrReadOnly]
+    version_lookup = staticmethod(atask_project_version)
+
+    async def get_data(self, request):
+        row_serializer = fast_serializer.task_detail_rows()
+        rows = row_serializer.values(Task.objects.filter(pk=self.kwargs['pk']))
+        return [row_serializer.to_representation(row) async for row in rows]
+
+
+class AsyncAssignList(AsyncReadView):
+    permission_classes = [IsProjectOwner]
+
+    async def get_data(self, request):
+        row_serializer = fast_serializer.assigned_user_rows()
+        rows = row_serializer.values(AssignedUser.objects.filter(project=self.kwargs['pk']).order_by('pk'))
+        return [row_serializer.to_representation(row) async for row in rows]
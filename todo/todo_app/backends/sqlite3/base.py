@@ -0,0 +1,28 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+# Django's SQLite backend with the 'transaction_mode' option of later Django versions. SQLite opens a plain
+# BEGIN as a read transaction and upgrades it on the first write. The upgrade fails at once with "database is
+# locked", without waiting busy_timeout, when another connection committed since the transaction read.
+# Statements that read before they write in the same transaction (the search index triggers do) then fail
+# under concurrent writes. BEGIN IMMEDIATE takes the write lock up front and waits for it instead.
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def transaction_mode(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        if mode is not None and mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f'transaction_mode must be one of {", ".join(TRANSACTION_MODES)} or None')
+        return mode
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('transaction_mode', None)
+        return params
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.transaction_mode
+        self.cursor().execute('BEGIN' if mode is None else f'BEGIN {mode.upper()}')
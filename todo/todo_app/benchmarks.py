@@ -0,0 +1,438 @@
+import asyncio
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+import tracemalloc
+from datetime import date, timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connections
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from todo_app import fast_serializer, rollups
+from todo_app.cache import response_cache
+from todo_app.serializer import ProjectSerializer, TaskSerializer
+from todo_app.models import Project, Task, AssignedUser, ArchivedProject
+from todo_app.archive import archive_batch
+from todo_app.utils import PROGRESS_FIELDS, update_project_fields
+from user_app.authentication import token_cache
+
+
+PASSWORD = 'benchmark-password'
+BULK_SIZE = 10  # tasks per request for the batch task endpoints
+
+
+# Users, projects, tasks and assignments for a benchmark run, seeded with bulk inserts. Every endpoint
+# that consumes what it acts on (deletes, assignments, logouts) gets its own pool with one object per
+# request, so each request of a run does the same amount of work.
+class Fixtures:
+
+    def __init__(self, users=20, projects=50, tasks=20, assignments=3, requests=20, seed=0):
+        self.random = random.Random(seed)
+        self.today = date.today()
+        self.requests = requests + 1  # one extra request per endpoint is made with memory tracing on
+
+        password = make_password(PASSWORD)  # hashed once, shared by every benchmark user
+        names = [f'bench-user-{i}' for i in range(users)] + [f'bench-spare-{i}' for i in range(self.requests)]
+        User.objects.bulk_create([User(username=name, email=f'{name}@example.com', password=password)
+                                  for name in names] + [User(username='bench-staff', password=password, is_staff=True)])
+        all_users = list(User.objects.filter(username__in=names + ['bench-staff']).order_by('pk'))
+        self.users, self.spare_users, self.staff = all_users[:users], all_users[users:-1], all_users[-1]
+        Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in all_users])
+        self.tokens = dict(Token.objects.values_list('user_id', 'key'))
+
+        self.projects = self.create_projects(projects, tasks, assignments)
+        self.doomed_projects = self.create_projects(self.requests, tasks, assignments)
+        self.doomed_tasks = self.create_tasks(self.projects, self.requests)
+        # BULK_SIZE tasks in one project for each batch request
+        self.doomed_bulk_tasks = self.create_tasks([self.project(i) for i in range(self.requests)
+                                                    for n in range(BULK_SIZE)], self.requests * BULK_SIZE)
+        self.tasks = list(Task.objects.filter(project__in=self.projects).exclude(
+            pk__in=[task.pk for task in self.doomed_tasks + self.doomed_bulk_tasks]).order_by('pk'))
+        # Completed projects moved to the archive tables
+        archived = self.create_projects(min(projects, 10), tasks, assignments)
+        Task.objects.filter(project__in=archived).update(task_pct_complete=100, task_completed=True)
+        call_command('rebuild_project_progress', stdout=StringIO())
+        Project.objects.filter(pk__in=[project.pk for project in archived]).update(
+            project_updated_at=timezone.now() - timedelta(days=settings.ARCHIVE_AFTER_DAYS + 1))
+        archive_batch([project.pk for project in archived], settings.ARCHIVE_AFTER_DAYS)
+        self.archived = list(ArchivedProject.objects.select_related('project_owner').order_by('pk'))
+
+    def create_projects(self, count, tasks, assignments):
+        projects = Project.objects.bulk_create([Project(
+            project_owner=self.users[i % len(self.users)],
+            project_name=f'Project {i}',
+            project_description='Benchmark project',
+            project_due_date=self.today + timedelta(days=365),
+        ) for i in range(count)])
+        self.create_tasks(projects, count * tasks)
+        AssignedUser.objects.bulk_create([
+            AssignedUser(project=project, user=self.users[(i + n + 1) % len(self.users)])
+            for i, project in enumerate(projects) for n in range(min(assignments, len(self.users) - 1))
+        ])
+        return projects
+
+    def create_tasks(self, projects, count):
+        tasks = []
+        for i in range(count):
+            project = projects[i % len(projects)]
+            pct = self.random.choice([0, 25, 50, 75, 100])
+            tasks.append(Task(
+                project=project,
+                task_owner=project.project_owner,
+                task_name=f'Task {i}',
+                task_notes='Benchmark task',
+                task_pct_complete=pct,
+                task_completed=pct == 100,
+                task_due_date=self.today + timedelta(days=self.random.randint(1, 300)),
+            ))
+        return Task.objects.bulk_create(tasks)
+
+    def project(self, i):
+        return self.projects[i % len(self.projects)]
+
+    def task(self, i):
+        return self.tasks[i % len(self.tasks)]
+
+    def archived_project(self, i):
+        return self.archived[i % len(self.archived)]
+
+    def task_data(self, **extra):
+        data = {
+            'task_name': 'Benchmark task',
+            'task_notes': 'Created by the benchmark',
+            'task_pct_complete': 0,
+            'task_due_date': (self.today + timedelta(days=30)).isoformat(),
+        }
+        data.update(extra)
+        return data
+
+
+# Every route of todo_app/urls.py and user_app/urls.py as (name, method, build). build(fixtures, i) returns
+# the url, the request body and the user making the i-th request (None for anonymous requests).
+def endpoints():
+    def project_url(name, f, i):
+        return reverse(name, kwargs={'pk': f.project(i).pk})
+
+    def bulk_tasks(f, i):
+        return f.doomed_bulk_tasks[i * BULK_SIZE:(i + 1) * BULK_SIZE]
+
+    return [
+        ('project-list', 'get', lambda f, i: (reverse('project-list'), None, f.project(i).project_owner)),
+        ('project-details', 'get', lambda f, i: (project_url('project-details', f, i), None, f.project(i).project_owner)),
+        ('task-list', 'get', lambda f, i: (project_url('task-list', f, i), None, f.project(i).project_owner)),
+        ('task-details', 'get', lambda f, i: (reverse('task-details', kwargs={'pk': f.task(i).pk}), None,
+                                              f.task(i).task_owner)),
+        ('my-tasks', 'get', lambda f, i: (reverse('my-tasks'), None, f.users[i % len(f.users)])),
+        ('search', 'get', lambda f, i: (f'{reverse("search")}?q=task {i % 100}', None, f.project(i).project_owner)),
+        ('archive-list', 'get', lambda f, i: (reverse('archive-list'), None, f.archived_project(i).project_owner)),
+        ('archive-details', 'get', lambda f, i: (reverse('archive-details', kwargs={'pk': f.archived_project(i).pk}),
+                                                 None, f.archived_project(i).project_owner)),
+        ('assign', 'get', lambda f, i: (project_url('assign', f, i), None, f.project(i).project_owner)),
+        ('export', 'get', lambda f, i: (reverse('export', kwargs={'dataset': 'tasks', 'file_format': 'ndjson'}),
+                                        None, f.staff)),
+        ('stats', 'get', lambda f, i: (reverse('stats'), None, f.staff)),
+        ('changes', 'get', lambda f, i: (reverse('changes'), None, f.users[i % len(f.users)])),
+        ('async-project-list', 'get', lambda f, i: (reverse('async-project-list'), None, f.project(i).project_owner)),
+        ('async-project-details', 'get', lambda f, i: (project_url('async-project-details', f, i), None,
+                                                       f.project(i).project_owner)),
+        ('async-task-list', 'get', lambda f, i: (project_url('async-task-list', f, i), None, f.project(i).project_owner)),
+        ('async-task-details', 'get', lambda f, i: (reverse('async-task-details', kwargs={'pk': f.task(i).pk}), None,
+                                                    f.task(i).task_owner)),
+        ('async-assign', 'get', lambda f, i: (project_url('async-assign', f, i), None, f.project(i).project_owner)),
+
+        ('project-list', 'post', lambda f, i: (reverse('project-list'), {
+            'project_name': f'New project {i}',
+            'project_description': 'Created by the benchmark',
+            'project_due_date': (f.today + timedelta(days=365)).isoformat(),
+        }, f.users[i % len(f.users)])),
+        ('project-details', 'put', lambda f, i: (project_url('project-details', f, i), {
+            'project_name': f'Project {i}',
+            'project_description': 'Updated by the benchmark',
+            'project_due_date': (f.today + timedelta(days=365)).isoformat(),
+        }, f.project(i).project_owner)),
+        ('task-create', 'post', lambda f, i: (project_url('task-create', f, i), f.task_data(),
+                                              f.project(i).project_owner)),
+        ('task-details', 'put', lambda f, i: (reverse('task-details', kwargs={'pk': f.task(i).pk}),
+                                              f.task_data(task_pct_complete=f.random.choice([0, 50, 100])),
+                                              f.task(i).task_owner)),
+        ('task-bulk', 'post', lambda f, i: (project_url('task-bulk', f, i), [f.task_data()] * BULK_SIZE,
+                                            f.project(i).project_owner)),
+        ('task-bulk', 'put', lambda f, i: (reverse('task-bulk', kwargs={'pk': bulk_tasks(f, i)[0].project_id}),
+                                           [dict(f.task_data(task_pct_complete=50), id=task.pk)
+                                            for task in bulk_tasks(f, i)],
+                                           bulk_tasks(f, i)[0].project.project_owner)),
+        ('task-bulk', 'delete', lambda f, i: (reverse('task-bulk', kwargs={'pk': bulk_tasks(f, i)[0].project_id}),
+                                              [task.pk for task in bulk_tasks(f, i)],
+                                              bulk_tasks(f, i)[0].project.project_owner)),
+        ('task-details', 'delete', lambda f, i: (reverse('task-details', kwargs={'pk': f.doomed_tasks[i].pk}),
+                                                 None, f.doomed_tasks[i].task_owner)),
+        ('assign', 'post', lambda f, i: (project_url('assign', f, i), {'user': f.spare_users[i].username},
+                                         f.project(i).project_owner)),
+        ('assign', 'delete', lambda f, i: (project_url('assign', f, i), {'user': f.spare_users[i].username},
+                                           f.project(i).project_owner)),
+        ('project-details', 'delete', lambda f, i: (reverse('project-details', kwargs={'pk': f.doomed_projects[i].pk}),
+                                                    None, f.doomed_projects[i].project_owner)),
+
+        ('register', 'post', lambda f, i: (reverse('register'), {
+            'username': f'bench-new-{i}',
+            'email': f'bench-new-{i}@example.com',
+            'password': PASSWORD,
+            'password2': PASSWORD,
+        }, None)),
+        ('login', 'post', lambda f, i: (reverse('login'), {'username': f.users[i % len(f.users)].username,
+                                                           'password': PASSWORD}, None)),
+        ('logou', 'post', lambda f, i: (reverse('logou'), None, f.spare_users[i])),
+    ]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def request(client, fixtures, method, url, data, user):
+    if user is None:
+        client.credentials()
+    else:
+        client.credentials(HTTP_AUTHORIZATION=f'Token {fixtures.tokens[user.pk]}')
+    response = getattr(client, method)(url, data, format='json')
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+# Drive every endpoint through the test client. Latency and query counts come from the untraced requests,
+# peak memory from one extra request per endpoint made with tracemalloc on.
+def run(fixtures, requests=20, only=None):
+    caches[response_cache.alias].clear()
+    token_cache.clear()
+    client = APIClient()
+    results = {}
+
+    for name, method, build in endpoints():
+        label = f'{method.upper()} {name}'
+        if only and name not in only:
+            continue
+        latencies, queries, statuses = [], [], {}
+        for i in range(requests):
+            url, data, user = build(fixtures, i)
+            with ExitStack() as stack:
+                # Every alias, reads go to the replicas when they are configured
+                captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+                start = time.perf_counter()
+                response = request(client, fixtures, method, url, data, user)
+                latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(sum(len(queries_of_alias) for queries_of_alias in captured))
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        url, data, user = build(fixtures, requests)
+        tracemalloc.start()
+        request(client, fixtures, method, url, data, user)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results[label] = {
+            'requests': requests,
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'queries': max(queries),
+            'peak_kb': round(peak / 1024, 1),
+            'errors': sum(count for status, count in statuses.items() if status >= 400),
+            'statuses': statuses,
+        }
+    return results
+
+
+# Budgets allow the recorded query count and the recorded p95 latency widened by a tolerance
+def make_budgets(results, latency_tolerance):
+    return {label: {'queries': result['queries'], 'p95_ms': round(result['p95_ms'] * (1 + latency_tolerance), 3)}
+            for label, result in results.items()}
+
+
+def check_budgets(results, budgets):
+    failures = []
+    for label, result in results.items():
+        if result['errors']:
+            failures.append(f'{label}: {result["errors"]} requests failed {result["statuses"]}')
+        budget = budgets.get(label)
+        if budget is None:
+            continue
+        if result['queries'] > budget['queries']:
+            failures.append(f'{label}: {result["queries"]} queries, budget {budget["queries"]}')
+        if result['p95_ms'] > budget['p95_ms']:
+            failures.append(f'{label}: p95 {result["p95_ms"]} ms, budget {budget["p95_ms"]} ms')
+    return failures
+
+
+# Time the ModelSerializer and values() row paths of the list endpoints on the same rows, and check that
+# both render byte-identical JSON
+def compare_serializers(fixtures, page_size=100, repeats=10):
+    from todo_app.views import project_queryset  # views import the url configuration
+
+    project = max(fixtures.projects, key=lambda project: Task.objects.filter(project=project).count())
+    tasks = Task.objects.filter(project=project).select_related('task_owner').order_by('task_due_date', 'id')
+
+    def projects_model():
+        return ProjectSerializer(project_queryset()[:page_size], many=True).data
+
+    def projects_rows():
+        row_serializer = fast_serializer.project_rows()
+        rows = list(row_serializer.values(Project.objects.order_by('pk'), 'id')[:page_size])
+        return fast_serializer.project_data(rows, row_serializer)
+
+    def tasks_model():
+        return TaskSerializer(tasks, many=True).data
+
+    def tasks_rows():
+        row_serializer = fast_serializer.task_rows()
+        return [row_serializer.to_representation(row) for row in row_serializer.values(tasks)]
+
+    renderer = JSONRenderer()
+    results = {}
+    for label, model_path, rows_path in [('project list', projects_model, projects_rows),
+                                         ('task list', tasks_model, tasks_rows)]:
+        timings = {}
+        for path_name, path in [('model', model_path), ('rows', rows_path)]:
+            latencies = []
+            for i in range(repeats):
+                start = time.perf_counter()
+                rendered = renderer.render(path())
+                latencies.append((time.perf_counter() - start) * 1000)
+            timings[path_name] = (percentile(latencies, 50), rendered)
+        results[label] = {
+            'model_p50_ms': round(timings['model'][0], 3),
+            'rows_p50_ms': round(timings['rows'][0], 3),
+            'speedup': round(timings['model'][0] / timings['rows'][0], 2),
+            'identical': timings['model'][1] == timings['rows'][1],
+        }
+    return results
+
+
+# Task writes against one project from `clients` threads at once: every thread adds `writes` tasks and
+# updates each of them, and all threads update one shared task with the version they read. Afterwards the
+# project aggregates must still match its tasks (no lost increments) and every update of the shared task
+# must have been applied or answered with 409.
+def concurrent_writes(fixtures, clients=8, writes=10):
+    project = fixtures.project(0)
+    owner = project.project_owner
+    shared = Task.objects.create(project=project, task_owner=owner, task_name='Shared task', task_notes='Contended',
+                                 task_pct_complete=0, task_due_date=fixtures.today + timedelta(days=30))
+    rollups.worker.flush()  # deltas of the writes before, queued by PROJECT_ROLLUP_MODE 'thread'
+    call_command('rebuild_project_progress', str(project.pk), stdout=StringIO())
+    barrier = threading.Barrier(clients)
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def write(n):
+        client = APIClient(raise_request_exception=False)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {fixtures.tokens[owner.pk]}')
+        seen = Counter()
+        try:
+            barrier.wait()
+            response = client.get(reverse('task-details', kwargs={'pk': shared.pk}))
+            version = response.data[0]['task_version'] if response.status_code == 200 else shared.task_version
+            seen[client.put(reverse('task-details', kwargs={'pk': shared.pk}),
+                            fixtures.task_data(task_pct_complete=n % 101, task_version=version),
+                            format='json').status_code] += 1
+            for i in range(writes):
+                response = client.post(reverse('task-create', kwargs={'pk': project.pk}), fixtures.task_data(),
+                                       format='json')
+                seen[response.status_code] += 1
+                if response.status_code == 201:
+                    seen[client.put(reverse('task-details', kwargs={'pk': response.data['id']}),
+                                    fixtures.task_data(task_pct_complete=(n + i) % 2 * 100),
+                                    format='json').status_code] += 1
+        finally:
+            connections.close_all()
+            with lock:
+                statuses.update(seen)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    rollups.worker.flush()
+
+    project.refresh_from_db()
+    stored = [getattr(project, field) for field in PROGRESS_FIELDS]
+    update_project_fields(project.pk)
+    project.refresh_from_db()
+    rebuilt = [getattr(project, field) for field in PROGRESS_FIELDS]
+    shared.refresh_from_db()
+    return {
+        'clients': clients,
+        'requests': sum(statuses.values()),
+        'requests_per_s': round(sum(statuses.values()) / elapsed, 1),
+        'statuses': dict(statuses),
+        'shared_task_updates': shared.task_version,
+        'consistent': stored == rebuilt and shared.task_version + statuses[409] == clients,
+    }
+
+
+# Read endpoints with a native async version as (label, sync url name, async url name, url kwargs)
+ASYNC_PAIRS = [
+    ('project list', 'project-list', 'async-project-list', lambda f, i: {}),
+    ('project details', 'project-details', 'async-project-details', lambda f, i: {'pk': f.project(i).pk}),
+    ('task list', 'task-list', 'async-task-list', lambda f, i: {'pk': f.project(i).pk}),
+    ('task details', 'task-details', 'async-task-details', lambda f, i: {'pk': f.task(i).pk}),
+    ('assign', 'assign', 'async-assign', lambda f, i: {'pk': f.project(i).pk}),
+]
+
+
+# Serve each read endpoint through the ASGI handler with `concurrency` requests in flight, once from the
+# sync view (run in the thread of the sync bridge) and once from its async version, and check that both
+# return the same body
+def compare_async(fixtures, concurrency=16, requests=100):
+    headers = {'AUTHORIZATION': f'Token {fixtures.tokens[fixtures.users[0].pk]}', 'ACCEPT': 'application/json'}
+
+    async def drive(name, kwargs):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(reverse(name, kwargs=kwargs(fixtures, i)), **headers)
+                latencies.append((time.perf_counter() - start) * 1000)
+                return response
+
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[one(i) for i in range(requests)])
+        return time.perf_counter() - start, latencies, responses
+
+    results = {}
+    for label, sync_name, async_name, kwargs in ASYNC_PAIRS:
+        timings = {}
+        for path_name, name in [('sync', sync_name), ('async', async_name)]:
+            caches[response_cache.alias].clear()
+            elapsed, latencies, responses = asyncio.run(drive(name, kwargs))
+            timings[path_name] = (elapsed, latencies, responses)
+        sync_bodies = [response.content.replace(b'/projects/', b'/projects/async/') for response in timings['sync'][2]]
+        results[label] = {
+            'concurrency': concurrency,
+            'sync_rps': round(requests / timings['sync'][0], 1),
+            'async_rps': round(requests / timings['async'][0], 1),
+            'sync_p95_ms': round(percentile(timings['sync'][1], 95), 3),
+            'async_p95_ms': round(percentile(timings['async'][1], 95), 3),
+            'identical': sync_bodies == [response.content for response in timings['async'][2]],
+        }
+    return results
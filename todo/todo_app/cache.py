@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import pickle
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+from todo_app.routers import reading_from_replica
+
+
+# Serialized project payloads kept in one of Django's caches. A project detail entry holds the project
+# version it was built from and the payload of each fieldset variant requested at that version, list pages
+# are keyed by a generation that changes on every write. The signal receivers in todo_app.signals drop
+# entries as projects, tasks and assigned users change.
+class ResponseCache:
+    generation_key = 'project-list:generation'
+
+    def __init__(self, alias, timeout):
+        self.alias = alias
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sizes = {}
+        self._building = {}  # key -> future of the build in progress, for the async lookups
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get_project(self, project_pk, project_version, build, variant=''):
+        key = f'project:{project_pk}'
+        entry = self.cache.get(key)
+        if entry is None or entry[0] != project_version:
+            entry = (project_version, {})
+        elif variant in entry[1]:
+            self.count_hit()
+            return entry[1][variant]
+        self.count_miss()
+        data = build()
+        entry[1][variant] = data
+        self.set(key, entry)
+        return data
+
+    # scope: the set of projects the page is built from, pages of different scopes never share an entry
+    def get_project_list(self, url, build, scope=''):
+        key = self.project_list_key(self.generation(), url, scope)
+        data = self.cache.get(key)
+        if data is not None:
+            self.count_hit()
+            return data
+        self.count_miss()
+        data = build()
+        self.set(key, data, timeout=self.list_timeout())
+        return data
+
+    # Twins of the lookups above for the async views, going through the cache's async API. Concurrent misses
+    # of one entry wait for a single build instead of all building it.
+    async def aget_project(self, project_pk, project_version, build, variant=''):
+        key = f'project:{project_pk}'
+        entry = await self.cache.aget(key)
+        if entry is None or entry[0] != project_version:
+            entry = (project_version, {})
+        elif variant in entry[1]:
+            self.count_hit()
+            return entry[1][variant]
+        self.count_miss()
+        data = await self.single_flight(f'{key}:{project_version}:{variant}', build)
+        entry[1][variant] = data
+        await self.aset(key, entry)
+        return data
+
+    async def aget_project_list(self, url, build, scope=''):
+        key = self.project_list_key(await self.ageneration(), url, scope)
+        data = await self.cache.aget(key)
+        if data is not None:
+            self.count_hit()
+            return data
+        self.count_miss()
+        data = await self.single_flight(key, build)
+        await self.aset(key, data, timeout=self.list_timeout())
+        return data
+
+    # A page read from a replica can miss writes the replica has not caught up with yet, and would be served
+    # until the next write. It is only kept for as long as clients that wrote read from the primary.
+    def list_timeout(self):
+        if reading_from_replica():
+            return settings.READ_YOUR_WRITES_SECONDS
+        return self.timeout
+
+    def project_list_key(self, generation, url, scope):
+        return f'project-list:{generation}:{hashlib.md5(f"{scope}|{url}".encode()).hexdigest()}'
+
+    async def single_flight(self, key, build):
+        future = self._building.get(key)
+        if future is None:
+            future = self._building[key] = asyncio.ensure_future(build())
+            future.add_done_callback(lambda done: self._building.pop(key, None))
+        return await asyncio.shield(future)
+
+    # A fresh random generation each time, so a generation evicted from the cache can never bring back
+    # pages built before the last write. add() keeps concurrent requests from each starting their own.
+    def generation(self):
+        generation = self.cache.get(self.generation_key)
+        if generation is None:
+            candidate = uuid.uuid4().hex
+            self.cache.add(self.generation_key, candidate, timeout=None)
+            generation = self.cache.get(self.generation_key) or candidate
+        return generation
+
+    async def ageneration(self):
+        generation = await self.cache.aget(self.generation_key)
+        if generation is None:
+            candidate = uuid.uuid4().hex
+            await self.cache.aadd(self.generation_key, candidate, timeout=None)
+            generation = await self.cache.aget(self.generation_key) or candidate
+        return generation
+
+    def invalidate_project(self, project_pk):
+        key = f'project:{project_pk}'
+        self.cache.delete_many([key, self.generation_key])
+        with self._lock:
+            self.invalidations = self.invalidations + 1
+            self._sizes.pop(key, None)
+            for stale in [stale for stale in self._sizes if stale.startswith('project-list:')]:
+                del self._sizes[stale]  # unreachable once the generation changed
+
+    # For writes that add projects without going through the signals (bulk imports)
+    def invalidate_lists(self):
+        self.cache.delete(self.generation_key)
+        with self._lock:
+            self.invalidations = self.invalidations + 1
+            for stale in [stale for stale in self._sizes if stale.startswith('project-list:')]:
+                del self._sizes[stale]
+
+    def set(self, key, value, timeout=None):
+        self.cache.set(key, value, timeout=self.timeout if timeout is None else timeout)
+        self.record_size(key, value)
+
+    async def aset(self, key, value, timeout=None):
+        await self.cache.aset(key, value, timeout=self.timeout if timeout is None else timeout)
+        self.record_size(key, value)
+
+    def record_size(self, key, value):
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        with self._lock:
+            self._sizes[key] = size
+
+    def count_hit(self):
+        with self._lock:
+            self.hits = self.hits + 1
+
+    def count_miss(self):
+        with self._lock:
+            self.misses = self.misses + 1
+
+    # Sizes are the pickled size of the entries this process stored, the backend may have evicted some
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'invalidations': self.invalidations,
+                'entries': len(self._sizes),
+                'bytes': sum(self._sizes.values()),
+                'largest_entry_bytes': max(self._sizes.values(), default=0),
+            }
+
+
+response_cache = ResponseCache(
+    alias=getattr(settings, 'PROJECT_RESPONSE_CACHE', 'default'),
+    timeout=getattr(settings, 'PROJECT_RESPONSE_CACHE_TIMEOUT', 300),
+)
@@ -0,0 +1,130 @@
+import base64
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from todo_app import fast_serializer
+from todo_app.models import Project, Task, AssignedUser, Tombstone
+
+
+# Feeds of the changes endpoint as (name, model, change time field, project field, row serializer factory).
+# The project field scopes the rows to the projects a user can see. Tasks and assigned users also carry the
+# id of their project, which their serializers leave out.
+FEEDS = [
+    ('projects', Project, 'project_updated_at', 'pk', lambda: fast_serializer.project_rows(None, ())),
+    ('tasks', Task, 'task_updated_at', 'project', fast_serializer.task_rows),
+    ('assigned_users', AssignedUser, 'assignment_updated_at', 'project', fast_serializer.assigned_user_rows),
+    ('deleted', Tombstone, 'deleted_at', 'project_pk', None),
+]
+
+DELETED_NAMES = {
+    Tombstone.PROJECT: 'projects',
+    Tombstone.TASK: 'tasks',
+    Tombstone.ASSIGNED_USER: 'assigned_users',
+}
+
+
+def encode_cursor(moment):
+    return base64.urlsafe_b64encode(moment.isoformat().encode()).decode()
+
+
+# Cursor of the ?since= parameter, None for a first sync. Cursors older than the tombstones kept are refused,
+# the client may have missed deletions and has to sync from scratch.
+def decode_cursor(encoded):
+    if not encoded:
+        return None
+    try:
+        moment = datetime.fromisoformat(base64.urlsafe_b64decode(encoded.encode()).decode())
+    except (TypeError, ValueError):
+        raise ValidationError({'since': 'Invalid cursor'})
+    if timezone.is_naive(moment):
+        raise ValidationError({'since': 'Invalid cursor'})
+    if moment < tombstones_kept_since():
+        raise CursorExpired()
+    return moment
+
+
+def tombstones_kept_since():
+    return timezone.now() - timedelta(days=settings.CHANGES_TOMBSTONE_DAYS)
+
+
+class CursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'The cursor is older than the deletions kept, sync again without ?since='
+    default_code = 'cursor_expired'
+
+
+# Rows of every feed changed in [since, until) ordered by change time, at most `limit` per feed. When a
+# feed has more, `until` is pulled back to the change time of its first row left out, so the next cursor
+# starts exactly where this page stopped. Rows are stamped before their transaction commits, so `until`
+# trails the current time by CHANGES_SETTLE_SECONDS for writes still in flight to land behind the cursor.
+# projects: queryset of the projects whose rows `user` is sent, None for every row.
+def changes_since(since, limit, projects=None, user=None):
+    until = timezone.now() - timedelta(seconds=settings.CHANGES_SETTLE_SECONDS)
+    if since is not None and since >= until:
+        return empty_page(since, since)
+
+    fetched = {}
+    truncated = False
+    for name, model, field, project_field, rows in FEEDS:
+        queryset = model.objects.filter(**{f'{field}__lt': until}).order_by(field, 'id')
+        if since is not None:
+            queryset = queryset.filter(**{f'{field}__gte': since})
+        if projects is not None:
+            visible = Q(**{f'{project_field}__in': projects.values('pk')})
+            if model is Tombstone:
+                visible |= Q(user=user)  # deleted projects and assignments of the user are out of `projects`
+            queryset = queryset.filter(visible)
+        row_serializer = rows() if rows is not None else None
+        if row_serializer is None:
+            queryset = queryset.values('model', 'object_id', field)
+        elif model is Project:
+            queryset = row_serializer.values(queryset, field)
+        else:
+            queryset = row_serializer.values(queryset, field, 'project_id')
+        page = list(queryset[:limit + 1])
+        if len(page) > limit:
+            truncated = True
+            cut = page[limit][field]
+            if cut == page[0][field]:
+                # More than `limit` rows share one change time (a batch write), take all of them or the cursor
+                # could never move past it
+                page = list(queryset.filter(**{field: cut}))
+                cut = cut + timedelta(microseconds=1)
+            until = min(until, cut)
+        fetched[name] = (field, row_serializer, page)
+
+    data = empty_page(since, until)
+    deleted = set()
+    for name, (field, row_serializer, page) in fetched.items():
+        for row in page:
+            if row[field] >= until:
+                break
+            if row_serializer is None:
+                # A deleted project has a tombstone per user who could see it
+                if (row['model'], row['object_id']) not in deleted:
+                    deleted.add((row['model'], row['object_id']))
+                    data['deleted'][DELETED_NAMES[row['model']]].append(row['object_id'])
+                continue
+            item = row_serializer.to_representation(row)
+            if name != 'projects':
+                item['project'] = row['project_id']
+            data[name].append(item)
+    data['has_more'] = truncated
+    return data
+
+
+def empty_page(since, until):
+    return {
+        'since': encode_cursor(since) if since is not None else None,
+        'next': encode_cursor(until),
+        'has_more': False,
+        'projects': [],
+        'tasks': [],
+        'assigned_users': [],
+        'deleted': {name: [] for name in DELETED_NAMES.values()},
+    }
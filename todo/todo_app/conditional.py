@@ -0,0 +1,74 @@
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from todo_app.models import Project, Task
+
+
+class NotModified(Exception):
+    pass
+
+
+# The negotiated format is part of the tag so the JSON and browsable representations differ
+def version_etag(version, renderer_format):
+    project_pk, project_version = version
+    return quote_etag(f'{project_pk}-{project_version}-{renderer_format}')
+
+
+def project_version(project_pk):
+    version = Project.objects.filter(pk=project_pk).values_list('project_version', flat=True).first()
+    if version is None:
+        return None
+    return project_pk, version
+
+
+def task_project_version(task_pk):
+    return Task.objects.filter(pk=task_pk).values_list('project_id', 'project__project_version').first()
+
+
+async def aproject_version(project_pk):
+    version = await Project.objects.filter(pk=project_pk).values_list('project_version', flat=True).afirst()
+    if version is None:
+        return None
+    return project_pk, version
+
+
+async def atask_project_version(task_pk):
+    return await Task.objects.filter(pk=task_pk).values_list('project_id', 'project__project_version').afirst()
+
+
+# Conditional GET for views whose payload only changes when the version of a project changes. The ETag is
+# worked out from the version alone, so once authentication and permissions have passed a matching
+# If-None-Match is answered with 304 before anything is serialized.
+class ProjectVersionETagMixin:
+    etag = None
+    # Looks up the version of the project of the url's pk, views whose pk is a task's set task_project_version
+    version_lookup = staticmethod(project_version)
+
+    # Version the response depends on as (project pk, version), or None when there is nothing to tag
+    def get_project_version(self, request, *args, **kwargs):
+        return self.version_lookup(self.kwargs['pk'])
+
+    def get_etag(self, request, *args, **kwargs):
+        version = self.get_project_version(request, *args, **kwargs)
+        if version is None:
+            return None
+        return version_etag(version, request.accepted_renderer.format)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            self.etag = self.get_etag(request, *args, **kwargs)
+            if self.etag is not None and self.etag in parse_etags(request.headers.get('If-None-Match', '')):
+                raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.etag is not None and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = self.etag
+        return response
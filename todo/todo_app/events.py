@@ -0,0 +1,212 @@
+import asyncio
+import json
+import logging
+import re
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from rest_framework import exceptions
+
+from todo_app import fast_serializer
+from todo_app.models import Project, Task
+from user_app.authentication import CachedTokenAuthentication
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_COLUMNS = ['id', 'project_no_tasks', 'project_pct_complete', 'project_completed', 'project_version']
+
+
+# In-process fan-out of project events to the server-sent event streams of this process. Publishing is
+# thread safe: events are handed to the event loop of each subscriber, whatever thread the write ran in.
+# A subscriber too slow to keep up with its queue gets a `resync` event instead of the events it missed.
+class EventBroker:
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = {}  # project pk -> {queue: loop}
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, project_pk):
+        queue = asyncio.Queue(self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(project_pk, {})[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, project_pk, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(project_pk, {})
+            subscribers.pop(queue, None)
+            if not subscribers:
+                self._subscribers.pop(project_pk, None)
+
+    def has_subscribers(self, project_pk):
+        return project_pk in self._subscribers
+
+    def publish(self, project_pk, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(project_pk, {}).items())
+            self.published = self.published + 1
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self.deliver, queue, (event, data))
+            except RuntimeError:  # the loop of the stream has closed
+                self.unsubscribe(project_pk, queue)
+
+    def deliver(self, queue, message):
+        if queue.full():
+            with self._lock:
+                self.dropped = self.dropped + 1
+            while not queue.empty():
+                queue.get_nowait()
+            message = ('resync', {})
+        queue.put_nowait(message)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'projects': len(self._subscribers),
+                'streams': sum(len(subscribers) for subscribers in self._subscribers.values()),
+                'published': self.published,
+                'dropped': self.dropped,
+            }
+
+
+broker = EventBroker(queue_size=getattr(settings, 'EVENTS_QUEUE_SIZE', 100))
+
+
+def progress_data(project_pk):
+    return Project.objects.filter(pk=project_pk).values(*PROGRESS_COLUMNS).first()
+
+
+# Publishing helpers called by the writes. Events are published once the write has committed and only
+# cost a query when the project has subscribers in this process.
+def progress_changed(project_pk):
+    def publish():
+        if broker.has_subscribers(project_pk):
+            data = progress_data(project_pk)
+            if data is not None:
+                broker.publish(project_pk, 'progress', data)
+    transaction.on_commit(publish)
+
+
+def tasks_changed(project_pk, task_pks):
+    def publish():
+        if broker.has_subscribers(project_pk):
+            row_serializer = fast_serializer.task_rows()
+            for row in row_serializer.values(Task.objects.filter(pk__in=task_pks).order_by('pk')):
+                broker.publish(project_pk, 'task', row_serializer.to_representation(row))
+    transaction.on_commit(publish)
+
+
+def tasks_deleted(project_pk, task_pks):
+    def publish():
+        for task_pk in task_pks:
+            broker.publish(project_pk, 'task_deleted', {'id': task_pk})
+    transaction.on_commit(publish)
+
+
+def encode_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'.encode()
+
+
+# Raw ASGI application streaming the events of one project as server-sent events, mounted by todo/asgi.py
+# in front of Django (4.1 cannot stream responses from async views). Authenticates with the same tokens as
+# the API, from the Authorization header or ?token= for EventSource clients, which cannot set headers.
+class EventStream:
+    path = re.compile(r'^/projects/(?P<pk>\d+)/events/$')
+
+    def __init__(self, keepalive):
+        self.keepalive = keepalive
+
+    def matches(self, scope):
+        return scope['type'] == 'http' and self.path.match(scope['path']) is not None
+
+    async def __call__(self, scope, receive, send):
+        project_pk = int(self.path.match(scope['path'])['pk'])
+        error = await self.check_request(scope, project_pk)
+        if error is not None:
+            await self.send_error(send, *error)
+            return
+
+        queue = broker.subscribe(project_pk)
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ]})
+            # Current progress first, so the client starts from the state the events change
+            data = await sync_to_async(self.initial_progress)(project_pk)
+            await send({'type': 'http.response.body', 'body': encode_event('progress', data), 'more_body': True})
+            await self.stream(queue, receive, send)
+        finally:
+            broker.unsubscribe(project_pk, queue)
+
+    async def stream(self, queue, receive, send):
+        disconnect = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        try:
+            while True:
+                message = asyncio.ensure_future(queue.get())
+                done, pending = await asyncio.wait({message, disconnect}, timeout=self.keepalive,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if disconnect in done:
+                    message.cancel()
+                    return
+                if message in done:
+                    body = encode_event(*message.result())
+                else:
+                    message.cancel()
+                    body = b': keepalive\n\n'
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        finally:
+            disconnect.cancel()
+
+    async def wait_for_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    # (status, message) of a request that cannot be streamed, None when it can
+    async def check_request(self, scope, project_pk):
+        headers = dict(scope['headers'])
+        key = None
+        authorization = headers.get(b'authorization', b'').decode().split()
+        if len(authorization) == 2 and authorization[0].lower() == 'token':
+            key = authorization[1]
+        else:
+            for param in scope.get('query_string', b'').decode().split('&'):
+                name, _, value = param.partition('=')
+                if name == 'token':
+                    key = value
+        if key is None:
+            return 401, 'Authentication credentials were not provided.'
+        return await sync_to_async(self.check_access)(key, project_pk)
+
+    def check_access(self, key, project_pk):
+        try:
+            CachedTokenAuthentication().authenticate_credentials(key)
+            if not Project.objects.filter(pk=project_pk).exists():
+                return 404, 'Not found.'
+        except exceptions.AuthenticationFailed as exc:
+            return 401, str(exc.detail)
+        finally:
+            close_old_connections()
+        return None
+
+    def initial_progress(self, project_pk):
+        try:
+            return progress_data(project_pk)
+        finally:
+            close_old_connections()
+
+    async def send_error(self, send, status, message):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': json.dumps({'detail': message}).encode()})
+
+
+event_stream = EventStream(keepalive=getattr(settings, 'EVENTS_KEEPALIVE_SECONDS', 15))
@@ -0,0 +1,66 @@
+import csv
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from todo_app.models import Project, Task
+
+
+# Columns of each export as (output name, values() lookup)
+PROJECT_COLUMNS = [
+    ('id', 'id'),
+    ('project_owner', 'project_owner__username'),
+    ('project_name', 'project_name'),
+    ('project_description', 'project_description'),
+    ('project_created_date', 'project_created_date'),
+    ('project_pct_complete', 'project_pct_complete'),
+    ('project_due_date', 'project_due_date'),
+    ('project_no_tasks', 'project_no_tasks'),
+    ('project_completed', 'project_completed'),
+]
+
+TASK_COLUMNS = [
+    ('id', 'id'),
+    ('project', 'project_id'),
+    ('task_owner', 'task_owner__username'),
+    ('task_name', 'task_name'),
+    ('task_notes', 'task_notes'),
+    ('task_created_date', 'task_created_date'),
+    ('task_last_update', 'task_last_update'),
+    ('task_pct_complete', 'task_pct_complete'),
+    ('task_due_date', 'task_due_date'),
+    ('task_completed', 'task_completed'),
+]
+
+DATASETS = {
+    'projects': (Project, PROJECT_COLUMNS),
+    'tasks': (Task, TASK_COLUMNS),
+}
+
+
+# Rows of a dataset read from the database in chunks, so only one chunk is held in memory at a time
+def export_rows(dataset):
+    model, columns = DATASETS[dataset]
+    lookups = [lookup for name, lookup in columns]
+    rows = model.objects.order_by('pk').values_list(*lookups)
+    return rows.iterator(chunk_size=getattr(settings, 'EXPORT_CHUNK_SIZE', 2000))
+
+
+def ndjson_lines(dataset):
+    names = [name for name, lookup in DATASETS[dataset][1]]
+    encoder = DjangoJSONEncoder()
+    for row in export_rows(dataset):
+        yield encoder.encode(dict(zip(names, row))) + '\n'
+
+
+# File-like object whose write() hands back the line, lets csv.writer produce lines for streaming
+class Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(dataset):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, lookup in DATASETS[dataset][1]])
+    for row in export_rows(dataset):
+        yield writer.writerow(row)
@@ -0,0 +1,119 @@
+from functools import lru_cache
+
+from rest_framework import serializers
+
+from todo_app.models import Project, Task, AssignedUser
+from todo_app.serializer import ProjectSerializer, TaskSerializer, TaskDetailSerializer, AssignUserSerializer, \
+    MyTaskSerializer
+
+
+# Column holding str() of an instance of a related model, StringRelatedField renders that value
+STR_COLUMNS = {
+    Project: 'project_name',
+}
+
+
+def str_column(model):
+    if model in STR_COLUMNS:
+        return STR_COLUMNS[model]
+    return model.USERNAME_FIELD  # User.__str__ is the username
+
+
+# Read-only representation of a serializer's fields built straight from values() rows, without the
+# per-instance and per-field overhead of ModelSerializer. Produces the same output as the serializer it is
+# built from: DRF fields are only called for values whose Python type differs from their representation
+# (dates, decimals), StringRelatedField owners come from a join. Nested list serializers get a
+# RowSerializer of their own in `nested` and are left as None for the caller to fill in.
+class RowSerializer:
+    # DRF fields whose representation is the value the database returns
+    identity_fields = (serializers.IntegerField, serializers.CharField, serializers.BooleanField)
+
+    def __init__(self, serializer):
+        model = serializer.Meta.model
+        self.columns = []  # (field name, values() lookup, converter)
+        self.nested = {}
+        for name, field in serializer.fields.items():
+            if isinstance(field, serializers.ListSerializer):
+                self.columns.append((name, None, None))
+                self.nested[name] = RowSerializer(field.child)
+                continue
+            model_field = model._meta.get_field(field.source)
+            if isinstance(field, serializers.StringRelatedField):
+                if model_field.is_relation:
+                    self.columns.append((name, f'{field.source}__{str_column(model_field.related_model)}', None))
+                else:
+                    self.columns.append((name, field.source, str))
+            elif isinstance(field, self.identity_fields):
+                self.columns.append((name, field.source, None))
+            else:
+                self.columns.append((name, field.source, field.to_representation))
+        self.lookups = [lookup for name, lookup, convert in self.columns if lookup is not None]
+
+    def values(self, queryset, *extra):
+        return queryset.values(*self.lookups, *[lookup for lookup in extra if lookup not in self.lookups])
+
+    def to_representation(self, row):
+        data = {}
+        for name, lookup, convert in self.columns:
+            value = None if lookup is None else row[lookup]
+            data[name] = value if convert is None or value is None else convert(value)
+        return data
+
+
+@lru_cache(maxsize=64)
+def project_rows(fields=None, expand=None):
+    return RowSerializer(ProjectSerializer(fields=fields, expand=expand))
+
+
+@lru_cache(maxsize=None)
+def task_rows():
+    return RowSerializer(TaskSerializer())
+
+
+@lru_cache(maxsize=None)
+def my_task_rows():
+    return RowSerializer(MyTaskSerializer())
+
+
+@lru_cache(maxsize=None)
+def task_detail_rows():
+    return RowSerializer(TaskDetailSerializer())
+
+
+@lru_cache(maxsize=None)
+def assigned_user_rows():
+    return RowSerializer(AssignUserSerializer())
+
+
+RELATED_MODELS = {'tasks': Task, 'assigned_users': AssignedUser}
+
+
+# Representation of a page of project rows, with the tasks and assigned users of the whole page loaded in
+# one query each when they are expanded
+def project_data(rows, row_serializer):
+    projects = [row_serializer.to_representation(row) for row in rows]
+    for name, child, queryset in related_rows(rows, row_serializer):
+        attach_related(projects, rows, name, child, queryset)
+    return projects
+
+
+async def aproject_data(rows, row_serializer):
+    projects = [row_serializer.to_representation(row) for row in rows]
+    for name, child, queryset in related_rows(rows, row_serializer):
+        attach_related(projects, rows, name, child, [row async for row in queryset])
+    return projects
+
+
+def related_rows(rows, row_serializer):
+    ids = [row['id'] for row in rows]
+    return [(name, child, child.values(RELATED_MODELS[name].objects.filter(project_id__in=ids).order_by('pk'),
+                                       'project_id'))
+            for name, child in row_serializer.nested.items()]
+
+
+def attach_related(projects, rows, name, child, related):
+    grouped = {}
+    for row in related:
+        grouped.setdefault(row['project_id'], []).append(child.to_representation(row))
+    for project, row in zip(projects, rows):
+        project[name] = grouped.get(row['id'], [])
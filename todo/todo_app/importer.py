@@ -0,0 +1,219 @@
+import csv
+import json
+import time
+from collections import Counter
+from io import StringIO
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from rest_framework import serializers
+
+from todo_app.cache import response_cache
+from todo_app.models import Project, Task, AssignedUser
+from todo_app.serializer import ProjectSerializer, TaskSerializer
+from todo_app.utils import bump_project_version
+
+# Datasets in the order they are imported, so tasks and assignments can refer to projects of the same import
+DATASETS = ['projects', 'tasks', 'assignments']
+
+
+# (line number, row) of a JSONL or CSV file, read one line at a time. Rows of lines that are not valid
+# JSON are None.
+def read_rows(path):
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, None
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+# Imports the rows of JSONL or CSV files in batches, each written with bulk_create in a transaction of its
+# own. Rows are checked with the rules of the API serializers, rows breaking them are reported and skipped.
+# The users and projects a batch refers to are looked up with one query per batch and remembered, and the
+# progress of every project that got tasks is rebuilt once by finish().
+#
+# Projects are referred to by the `id` they have in the projects file (the export endpoint writes it). With
+# `existing_projects`, references that are not ids of the file are the ids of projects already in the database.
+# Ids of projects the file has but that were rejected refer to no project, never to a database project that
+# happens to have the same id. Users are referred to by username.
+class Importer:
+
+    def __init__(self, batch_size=1000, default_owner=None, existing_projects=False, log=None, log_error=None):
+        self.batch_size = batch_size
+        self.default_owner = default_owner
+        self.existing_projects = existing_projects
+        self.log = log or (lambda message: None)
+        self.log_error = log_error or (lambda message: None)
+        self.project_serializer = ProjectSerializer()
+        self.task_serializer = TaskSerializer()
+        self.user_ids = {}  # username -> pk, None for usernames that do not exist
+        self.project_ids = {}  # id in the file or in the database -> pk, None for projects that do not exist
+        self.touched = set()  # projects whose progress is rebuilt by finish()
+        self.assigned = set()  # projects whose version is bumped by finish()
+        self.rows = Counter()
+        self.imported = Counter()
+        self.rejected = Counter()
+        self.started = time.perf_counter()
+
+    def import_file(self, dataset, path):
+        import_batch = getattr(self, f'import_{dataset}')
+        for batch in batches(read_rows(path), self.batch_size):
+            self.rows[dataset] += len(batch)
+            import_batch(path, batch)
+            elapsed = time.perf_counter() - self.started
+            self.log(f'{dataset}: {self.rows[dataset]} rows read, {self.imported[dataset]} imported, '
+                     f'{self.rejected[dataset]} rejected, {sum(self.rows.values()) / elapsed:.0f} rows/s')
+
+    def import_projects(self, path, batch):
+        rows = list(self.objects(path, batch, 'projects'))
+        self.lookup_users(row.get('project_owner') for line, row in rows)
+        projects, file_ids = [], []
+        for line, row in rows:
+            errors = {}
+            data = self.validate(self.project_serializer, row, errors)
+            owner = self.user_id(row.get('project_owner'), 'project_owner', errors)
+            if errors:
+                self.reject(path, line, errors, 'projects')
+                if row.get('id') not in (None, ''):
+                    self.project_ids.setdefault(str(row['id']), None)
+                continue
+            projects.append(Project(project_owner_id=owner, **data))
+            file_ids.append(row.get('id'))
+
+        with transaction.atomic():
+            if connection.features.can_return_rows_from_bulk_insert:
+                Project.objects.bulk_create(projects)
+            else:  # the pks are needed to map the ids of the file
+                for project in projects:
+                    project.save()
+        for file_id, project in zip(file_ids, projects):
+            if file_id not in (None, ''):
+                self.project_ids[str(file_id)] = project.pk
+        self.imported['projects'] += len(projects)
+
+    def import_tasks(self, path, batch):
+        rows = list(self.objects(path, batch, 'tasks'))
+        self.lookup_users(row.get('task_owner') for line, row in rows)
+        self.lookup_projects(row.get('project') for line, row in rows)
+        tasks = []
+        for line, row in rows:
+            errors = {}
+            data = self.validate(self.task_serializer, row, errors)
+            owner = self.user_id(row.get('task_owner'), 'task_owner', errors)
+            project = self.project_id(row.get('project'), errors)
+            if errors:
+                self.reject(path, line, errors, 'tasks')
+                continue
+            tasks.append(Task(project_id=project, task_owner_id=owner,
+                              task_completed=data['task_pct_complete'] == 100, **data))
+
+        with transaction.atomic():
+            Task.objects.bulk_create(tasks)
+        self.touched.update(task.project_id for task in tasks)
+        self.imported['tasks'] += len(tasks)
+
+    def import_assignments(self, path, batch):
+        rows = list(self.objects(path, batch, 'assignments'))
+        self.lookup_users(row.get('user') for line, row in rows)
+        self.lookup_projects(row.get('project') for line, row in rows)
+        assignments = []
+        for line, row in rows:
+            errors = {}
+            user = self.user_id(row.get('user'), 'user', errors, default=False)
+            project = self.project_id(row.get('project'), errors)
+            if errors:
+                self.reject(path, line, errors, 'assignments')
+                continue
+            assignments.append(AssignedUser(project_id=project, user_id=user))
+
+        # Assignments already in the database are skipped by the unique (project, user) constraint
+        with transaction.atomic():
+            AssignedUser.objects.bulk_create(assignments, ignore_conflicts=True)
+        self.assigned.update(assignment.project_id for assignment in assignments)
+        self.imported['assignments'] += len(assignments)
+
+    # Rebuild the progress of the projects that got tasks from two queries per batch of projects, bump the
+    # version of the projects that got assigned users, whose progress does not change, and drop their cached
+    # responses
+    def finish(self):
+        touched = sorted(self.touched)
+        for batch in batches(touched, self.batch_size):
+            call_command('rebuild_project_progress', *batch, batch_size=len(batch), stdout=StringIO())
+            for project_pk in batch:
+                response_cache.invalidate_project(project_pk)
+        for batch in batches(sorted(self.assigned), self.batch_size):
+            with transaction.atomic():
+                for project_pk in batch:
+                    bump_project_version(project_pk)
+        if self.imported['projects']:
+            response_cache.invalidate_lists()
+        self.log(f'Rebuilt the progress of {len(touched)} projects in {time.perf_counter() - self.started:.1f}s')
+
+    # Rows of a batch that are JSON objects, reporting the others
+    def objects(self, path, batch, dataset):
+        for line, row in batch:
+            if isinstance(row, dict):
+                yield line, row
+            else:
+                self.reject(path, line, 'Each line must be a JSON object', dataset)
+
+    # Validated data of a row, None when it breaks the rules of the serializer. Errors are added to `errors`.
+    def validate(self, serializer, row, errors):
+        try:
+            return serializer.run_validation(row)
+        except serializers.ValidationError as exc:
+            errors.update(exc.detail if isinstance(exc.detail, dict) else {'non_field_errors': exc.detail})
+            return None
+
+    def lookup_users(self, usernames):
+        missing = {username or self.default_owner for username in usernames}.difference(self.user_ids, [None, ''])
+        if missing:
+            self.user_ids.update(User.objects.filter(username__in=missing).values_list('username', 'pk'))
+            for username in missing:
+                self.user_ids.setdefault(username, None)
+
+    def lookup_projects(self, project_ids):
+        missing = {str(project_id) for project_id in project_ids}.difference(self.project_ids)
+        existing = [int(project_id) for project_id in missing if project_id.isdigit()]
+        if existing and self.existing_projects:
+            self.project_ids.update((str(pk), pk) for pk in Project.objects.filter(pk__in=existing)
+                                    .values_list('pk', flat=True))
+        for project_id in missing:
+            self.project_ids.setdefault(project_id, None)
+
+    def user_id(self, username, field, errors, default=True):
+        if not username and default:
+            username = self.default_owner
+        user_id = self.user_ids.get(username)
+        if user_id is None:
+            errors[field] = f'The username {username} does not exist'
+        return user_id
+
+    def project_id(self, project_id, errors):
+        pk = self.project_ids.get(str(project_id))
+        if pk is None:
+            errors['project'] = f'The project {project_id} does not exist'
+        return pk
+
+    def reject(self, path, line, errors, dataset):
+        self.rejected[dataset] += 1
+        self.log_error(f'{path}:{line}: {json.dumps(errors)}')
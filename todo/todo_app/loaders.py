@@ -0,0 +1,57 @@
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+
+from todo_app.models import Project, Task
+
+
+# Projects and tasks looked up by the permission classes and the views of a request are loaded once,
+# together with their owners, and kept on the request for the rest of it.
+def _loaded(request):
+    loaded = getattr(request, '_todo_loaded', None)
+    if loaded is None:
+        loaded = request._todo_loaded = {}
+    return loaded
+
+
+def get_project(request, pk):
+    loaded = _loaded(request)
+    key = ('project', int(pk))
+    if key not in loaded:
+        loaded[key] = get_object_or_404(Project.objects.select_related('project_owner'), pk=pk)
+    return loaded[key]
+
+
+async def aget_project(request, pk):
+    loaded = _loaded(request)
+    key = ('project', int(pk))
+    if key not in loaded:
+        loaded[key] = await aget_object_or_404(Project.objects.select_related('project_owner'), pk=pk)
+    return loaded[key]
+
+
+def get_task(request, pk):
+    loaded = _loaded(request)
+    key = ('task', int(pk))
+    if key not in loaded:
+        task = get_object_or_404(Task.objects.select_related('task_owner', 'project__project_owner'), pk=pk)
+        loaded[key] = task
+        loaded.setdefault(('project', task.project_id), task.project)
+    return loaded[key]
+
+
+async def aget_task(request, pk):
+    loaded = _loaded(request)
+    key = ('task', int(pk))
+    if key not in loaded:
+        task = await aget_object_or_404(Task.objects.select_related('task_owner', 'project__project_owner'), pk=pk)
+        loaded[key] = task
+        loaded.setdefault(('project', task.project_id), task.project)
+    return loaded[key]
+
+
+# get_object_or_404 through the async ORM (Django 4.1 has no async shortcut)
+async def aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404
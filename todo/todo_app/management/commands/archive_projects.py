@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from todo_app.archive import archivable_projects, archive_batch
+
+
+class Command(BaseCommand):
+    help = ('Move completed projects unchanged for --days days, with their tasks and assigned users, out of the '
+            'hot tables into the archive tables, in batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help='Days a completed project has been unchanged before it is archived.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Projects moved per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the projects to archive.')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if options['dry_run']:
+            self.stdout.write(f'{archivable_projects(days).count()} projects to archive.')
+            return
+
+        start = time.perf_counter()
+        moved = 0
+        last_pk = 0
+        while True:
+            # Batches are picked by pk, so projects that stopped being archivable are not picked again
+            pks = list(archivable_projects(days).filter(pk__gt=last_pk).order_by('pk')
+                       .values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            moved = moved + archive_batch(pks, days)
+            last_pk = pks[-1]
+            self.stdout.write(f'Archived {moved} projects, {moved / (time.perf_counter() - start):.0f} projects/s')
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} projects.'))
@@ -0,0 +1,123 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.db import connection, connections
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from todo_app import benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database and report latency, query counts and peak memory of every '
+            'endpoint. With --check, fail when a result goes past the budgets recorded with --record.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--projects', type=int, default=50)
+        parser.add_argument('--tasks', type=int, default=20, help='Tasks per project.')
+        parser.add_argument('--assignments', type=int, default=3, help='Assigned users per project.')
+        parser.add_argument('--requests', type=int, default=20, help='Requests per endpoint.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--only', nargs='+', help='Only benchmark these url names.')
+        parser.add_argument('--json', help='Write the results to this file.')
+        parser.add_argument('--record', help='Write query and latency budgets from this run to this file.')
+        parser.add_argument('--latency-tolerance', type=float, default=0.5,
+                            help='Headroom added to the recorded p95 latencies (0.5 = 50%%).')
+        parser.add_argument('--check', help='Fail when a result goes past the budgets in this file.')
+        parser.add_argument('--serializers', action='store_true',
+                            help='Also compare the ModelSerializer and values() row paths of the list endpoints.')
+        parser.add_argument('--async-concurrency', type=int, default=0,
+                            help='Also serve the read endpoints through ASGI with this many requests in flight, '
+                                 'from the sync views and from their async versions.')
+        parser.add_argument('--concurrency', type=int, default=0,
+                            help='Also write tasks of one project from this many threads at once and check that '
+                                 'no update was lost.')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] and connection.vendor == 'sqlite':
+            # The shared in-memory test database fails concurrent writers with "table is locked" instead of
+            # making them wait, use a database file
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.gettempdir(), 'todo-benchmark.sqlite3')
+        setup_test_environment()
+        throttles = override_settings(THROTTLE_ENABLED=False)  # the benchmark measures the views, not the limits
+        throttles.enable()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        for alias in settings.READ_DATABASES:  # replicas read the test database, as under the test runner
+            connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+        try:
+            fixtures = benchmarks.Fixtures(
+                users=options['users'],
+                projects=options['projects'],
+                tasks=options['tasks'],
+                assignments=options['assignments'],
+                requests=options['requests'],
+                seed=options['seed'],
+            )
+            results = benchmarks.run(fixtures, requests=options['requests'], only=options['only'])
+            if options['serializers']:
+                serializer_results = benchmarks.compare_serializers(fixtures)
+            if options['async_concurrency']:
+                async_results = benchmarks.compare_async(fixtures, concurrency=options['async_concurrency'],
+                                                         requests=options['requests'] * 5)
+            if options['concurrency']:
+                concurrency_results = benchmarks.concurrent_writes(fixtures, clients=options['concurrency'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            throttles.disable()
+            teardown_test_environment()
+
+        self.report(results)
+        if options['serializers']:
+            self.report_serializers(serializer_results)
+        if options['async_concurrency']:
+            self.report_async(async_results)
+        if options['concurrency']:
+            self.report_concurrency(concurrency_results)
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump(results, f, indent=2)
+        if options['record']:
+            with open(options['record'], 'w') as f:
+                json.dump(benchmarks.make_budgets(results, options['latency_tolerance']), f, indent=2)
+        if options['check']:
+            with open(options['check']) as f:
+                failures = benchmarks.check_budgets(results, json.load(f))
+            if failures:
+                raise CommandError('Benchmark budgets exceeded:\n' + '\n'.join(failures))
+            self.stdout.write(self.style.SUCCESS('All endpoints within budget.'))
+
+    def report(self, results):
+        self.stdout.write(f'{"endpoint":<28}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"queries":>9}'
+                          f'{"peak KB":>10}{"errors":>8}')
+        for label, result in results.items():
+            self.stdout.write(f'{label:<28}{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}'
+                              f'{result["p99_ms"]:>10.2f}{result["queries"]:>9}{result["peak_kb"]:>10.1f}'
+                              f'{result["errors"]:>8}')
+
+    def report_serializers(self, results):
+        self.stdout.write(f'\n{"serializer":<28}{"model ms":>10}{"rows ms":>10}{"speedup":>9}{"identical":>11}')
+        for label, result in results.items():
+            self.stdout.write(f'{label:<28}{result["model_p50_ms"]:>10.2f}{result["rows_p50_ms"]:>10.2f}'
+                              f'{result["speedup"]:>8.2f}x{str(result["identical"]):>11}')
+        if not all(result['identical'] for result in results.values()):
+            raise CommandError('The values() row path renders different JSON from the serializers.')
+
+    def report_async(self, results):
+        self.stdout.write(f'\n{"sync vs async":<28}{"sync rps":>10}{"async rps":>11}{"sync p95":>10}'
+                          f'{"async p95":>11}{"identical":>11}')
+        for label, result in results.items():
+            self.stdout.write(f'{label:<28}{result["sync_rps"]:>10.1f}{result["async_rps"]:>11.1f}'
+                              f'{result["sync_p95_ms"]:>10.2f}{result["async_p95_ms"]:>11.2f}'
+                              f'{str(result["identical"]):>11}')
+        if not all(result['identical'] for result in results.values()):
+            raise CommandError('The async views return different bodies from the sync views.')
+
+    def report_concurrency(self, result):
+        self.stdout.write(f'\n{result["clients"]} concurrent clients: {result["requests"]} requests, '
+                          f'{result["requests_per_s"]} requests/s, statuses {result["statuses"]}, '
+                          f'{result["shared_task_updates"]} updates of the shared task applied')
+        if not result['consistent']:
+            raise CommandError('Concurrent task writes lost updates.')
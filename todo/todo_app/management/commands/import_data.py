@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from todo_app.importer import DATASETS, Importer
+
+
+class Command(BaseCommand):
+    help = ('Import projects, tasks and assignments from JSONL or CSV files (by extension), in batches. The '
+            'files of the export endpoint can be imported as they are. Tasks and assignments refer to projects '
+            'by the id they have in the projects file, or with --existing-projects by the id of a project '
+            'already in the database, and to users by username.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--projects', help='File of projects: project_owner, project_name, '
+                                               'project_description, project_due_date and an optional id.')
+        parser.add_argument('--tasks', help='File of tasks: project, task_owner, task_name, task_notes, '
+                                            'task_pct_complete and task_due_date.')
+        parser.add_argument('--assignments', help='File of assignments: project and user.')
+        parser.add_argument('--owner', help='Username owning the projects and tasks of rows without an owner.')
+        parser.add_argument('--existing-projects', action='store_true',
+                            help='Resolve project references that are not ids of the projects file as ids of '
+                                 'projects already in the database.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows written per transaction.')
+
+    def handle(self, *args, **options):
+        if not any(options[dataset] for dataset in DATASETS):
+            raise CommandError('Give at least one of --projects, --tasks and --assignments.')
+        importer = Importer(batch_size=options['batch_size'], default_owner=options['owner'],
+                            existing_projects=options['existing_projects'], log=self.stdout.write,
+                            log_error=self.stderr.write)
+        for dataset in DATASETS:
+            if options[dataset]:
+                try:
+                    importer.import_file(dataset, options[dataset])
+                except OSError as exc:
+                    raise CommandError(f'Cannot read {options[dataset]}: {exc}')
+        importer.finish()
+
+        summary = ', '.join(f'{importer.imported[dataset]} {dataset}' for dataset in DATASETS if options[dataset])
+        self.stdout.write(self.style.SUCCESS(f'Imported {summary}.'))
+        rejected = sum(importer.rejected.values())
+        if rejected:
+            self.stdout.write(self.style.WARNING(f'{rejected} rows rejected, see the errors above.'))
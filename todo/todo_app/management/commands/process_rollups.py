@@ -0,0 +1,40 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from todo_app.models import PendingRollup
+from todo_app.rollups import apply_rollup
+
+
+class Command(BaseCommand):
+    help = ('Recompute the rollups of projects queued in the PendingRollup table '
+            '(PROJECT_ROLLUP_MODE = "queue"), once per project per debounce window.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process everything queued and exit.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls.')
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        debounce = timedelta(seconds=getattr(settings, 'PROJECT_ROLLUP_DEBOUNCE', 0.5))
+        while True:
+            processed = self.process(timezone.now() - (timedelta(0) if options['once'] else debounce),
+                                     options['batch_size'])
+            if processed:
+                self.stdout.write(f'Recomputed {processed} projects.')
+            if options['once'] and not processed:
+                return
+            if not processed:
+                time.sleep(options['interval'])
+
+    def process(self, queued_before, batch_size):
+        project_pks = list(PendingRollup.objects.filter(queued_at__lte=queued_before)
+                           .order_by('queued_at').values_list('project_id', flat=True)[:batch_size])
+        for project_pk in project_pks:
+            # Unmark before recomputing, so writes that land during the recompute mark the project again
+            PendingRollup.objects.filter(project_id=project_pk).delete()
+            apply_rollup(project_pk, rebuild=True)
+        return len(project_pks)
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from todo_app.changes import tombstones_kept_since
+from todo_app.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = 'Delete the tombstones of deletions older than CHANGES_TOMBSTONE_DAYS.'
+
+    def handle(self, *args, **options):
+        deleted, _ = Tombstone.objects.filter(deleted_at__lt=tombstones_kept_since()).delete()
+        self.stdout.write(f'Deleted {deleted} tombstones.')
@@ -0,0 +1,51 @@
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from todo_app.models import Project
+from todo_app.utils import PROGRESS_FIELDS, rebuilt_progress, invalidate_project_cache
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the running progress aggregates of projects from their tasks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('project_ids', nargs='*', type=int, help='Only rebuild these projects.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        projects = Project.objects.order_by('pk')
+        if options['project_ids']:
+            projects = projects.filter(pk__in=options['project_ids'])
+        # Projects whose stored progress differs from their tasks
+        drifted = reduce(or_, (~Q(**{field: F(f'rebuilt_{field}')}) for field in PROGRESS_FIELDS))
+
+        checked = 0
+        rebuilt = 0
+        last_pk = 0
+        while True:
+            pks = list(projects.filter(pk__gt=last_pk).values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            last_pk = pks[-1]
+            checked = checked + len(pks)
+            rebuild = list(Project.objects.filter(pk__in=pks)
+                           .alias(**{f'rebuilt_{field}': value for field, value in rebuilt_progress().items()})
+                           .filter(drifted).values_list('pk', flat=True))
+            if not rebuild:
+                continue
+            # The aggregates are recomputed by the UPDATE itself, so task deltas committed since the check are
+            # counted instead of overwritten
+            with transaction.atomic():
+                Project.objects.filter(pk__in=rebuild).update(project_version=F('project_version') + 1,
+                                                              project_updated_at=timezone.now(),
+                                                              **rebuilt_progress())
+                for project_pk in rebuild:
+                    invalidate_project_cache(project_pk)
+            rebuilt = rebuilt + len(rebuild)
+
+        self.stdout.write(f'Checked {checked} projects, rebuilt {rebuilt}.')
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from todo_app import search
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the full-text search indexes of projects and tasks from their tables, creating the indexes '
+            'and triggers that are missing.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database whose indexes are rebuilt.')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('The search indexes use SQLite FTS5, this database has none.')
+        start = time.perf_counter()
+        search.rebuild(connection)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt the {", ".join(search.INDEXES)} search indexes in {time.perf_counter() - start:.1f}s.'))
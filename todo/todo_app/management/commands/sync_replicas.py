@@ -0,0 +1,30 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from todo_app.routers import PRIMARY
+
+
+class Command(BaseCommand):
+    help = ('Copy the primary SQLite database into the SQLite files standing in for the read replicas of '
+            'READ_DATABASES, to try replica routing locally.')
+
+    def handle(self, *args, **options):
+        primary = connections[PRIMARY]
+        if not settings.READ_DATABASES:
+            raise CommandError('No read replicas configured, set TODO_READ_REPLICAS.')
+        if primary.vendor != 'sqlite':
+            raise CommandError('Only SQLite files standing in for replicas can be copied, replicate the primary '
+                               'with the tools of its database.')
+        primary.ensure_connection()
+        for alias in settings.READ_DATABASES:
+            connections[alias].close()
+            name = connections[alias].settings_dict['NAME']
+            replica = sqlite3.connect(name)
+            try:
+                primary.connection.backup(replica)  # online copy, consistent while the primary is written to
+            finally:
+                replica.close()
+            self.stdout.write(f'Copied the primary to {alias} ({name}).')
@@ -0,0 +1,255 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from todo_app.routers import PRIMARY, RoutingState, pick_replica, routing, routing_stats
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in milliseconds of the latency histogram buckets, the last bucket takes everything slower
+LATENCY_BUCKETS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float('inf')]
+
+
+# Database execute wrapper counting the queries of one request. Identical SQL with identical parameters
+# is a duplicate, identical SQL with other parameters a similar query (the N+1 pattern).
+class QueryRecorder:
+
+    def __init__(self):
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements[(sql, repr(params))] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self):
+        return sum(self.statements.values())
+
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def similar(self):
+        by_sql = Counter()
+        for (sql, params), count in self.statements.items():
+            by_sql[sql] += count
+        return sum(count - 1 for count in by_sql.values() if count > 1)
+
+    def most_repeated(self):
+        by_sql = Counter()
+        for (sql, params), count in self.statements.items():
+            by_sql[sql] += count
+        return by_sql.most_common(1)[0] if by_sql else (None, 0)
+
+
+class ViewStat:
+
+    def __init__(self):
+        self.requests = 0
+        self.total_ms = 0
+        self.max_ms = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.queries = 0
+        self.max_queries = 0
+        self.duplicate_queries = 0
+        self.similar_queries = 0
+        self.requests_with_duplicates = 0
+        self.most_repeated_sql = None
+
+    def record(self, elapsed_ms, recorder):
+        self.requests = self.requests + 1
+        self.total_ms = self.total_ms + elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.buckets[next(i for i, bound in enumerate(LATENCY_BUCKETS) if elapsed_ms <= bound)] += 1
+        count = recorder.count
+        self.queries = self.queries + count
+        self.max_queries = max(self.max_queries, count)
+        duplicates = recorder.duplicates()
+        self.duplicate_queries = self.duplicate_queries + duplicates
+        self.similar_queries = self.similar_queries + recorder.similar()
+        if duplicates:
+            self.requests_with_duplicates = self.requests_with_duplicates + 1
+        sql, repeats = recorder.most_repeated()
+        if repeats > 1:
+            self.most_repeated_sql = sql
+
+    # Percentiles are the upper bound of the bucket they fall in
+    def percentile(self, pct):
+        target = pct / 100 * self.requests
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen = seen + count
+            if seen >= target:
+                return bound if bound != float('inf') else round(self.max_ms, 3)
+        return None
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'mean_ms': round(self.total_ms / self.requests, 3),
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': round(self.max_ms, 3),
+            'histogram_ms': {('+inf' if bound == float('inf') else str(bound)): count
+                             for bound, count in zip(LATENCY_BUCKETS, self.buckets)},
+            'mean_queries': round(self.queries / self.requests, 2),
+            'max_queries': self.max_queries,
+            'duplicate_queries': self.duplicate_queries,
+            'similar_queries': self.similar_queries,
+            'requests_with_duplicates': self.requests_with_duplicates,
+            'most_repeated_sql': self.most_repeated_sql,
+        }
+
+
+class ViewStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view, elapsed_ms, recorder):
+        with self._lock:
+            self._views.setdefault(view, ViewStat()).record(elapsed_ms, recorder)
+
+    def snapshot(self):
+        with self._lock:
+            return {view: stat.as_dict() for view, stat in sorted(self._views.items())}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+view_stats = ViewStats()
+
+
+# Records latency, query count and duplicate queries of every request per view (method and url name) in
+# view_stats. Queries run while a streaming response is consumed happen after this returns and are not
+# counted. Runs in the async request path too, so it does not force async views through the sync bridge.
+class ViewStatsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'VIEW_STATS_SLOW_MS', 500)
+        self.async_mode = asyncio.iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            start = time.perf_counter()
+            response = self.get_response(request)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        return self.record(request, response, elapsed_ms, recorder)
+
+    # Connections belong to threads: the queries of an async request run in the thread of the sync bridge
+    # for its request context, so the wrappers are installed from that thread
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        stack = ExitStack()
+        await sync_to_async(self.wrap_connections)(stack, recorder)
+        try:
+            start = time.perf_counter()
+            response = await self.get_response(request)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        finally:
+            await sync_to_async(stack.close)()
+        return self.record(request, response, elapsed_ms, recorder)
+
+    def wrap_connections(self, stack, recorder):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+
+    def record(self, request, response, elapsed_ms, recorder):
+        match = request.resolver_match
+        if match is None:
+            return response
+        view = f'{request.method} {match.view_name}'
+        view_stats.record(view, elapsed_ms, recorder)
+
+        if elapsed_ms > self.slow_ms:
+            logger.warning('slow request: view=%s status=%s ms=%.1f queries=%s',
+                           view, response.status_code, elapsed_ms, recorder.count)
+        if recorder.duplicates():
+            logger.info('duplicate queries: view=%s duplicates=%s sql=%s',
+                        view, recorder.duplicates(), recorder.most_repeated()[0])
+        logger.debug('request: view=%s status=%s ms=%.1f queries=%s',
+                     view, response.status_code, elapsed_ms, recorder.count)
+        return response
+
+
+# Picks the database the reads of each request go to, see todo_app.routers. GET, HEAD and OPTIONS requests
+# read from a replica of settings.READ_DATABASES, other requests from the primary. A client whose request
+# wrote to the database reads from the primary for the next READ_YOUR_WRITES_SECONDS, which needs a cache
+# shared by the server processes to hold across them.
+class ReadReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = asyncio.iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = self.routing_state(request)
+        token = routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing.reset(token)
+        self.remember_write(request, state)
+        return response
+
+    async def __acall__(self, request):
+        state = self.routing_state(request)
+        token = routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routing.reset(token)
+        self.remember_write(request, state)
+        return response
+
+    def routing_state(self, request):
+        if not settings.READ_DATABASES or request.method not in self.safe_methods:
+            return RoutingState()
+        client = self.client_key(request)
+        if client is not None and cache.get(client):
+            routing_stats.record('read_your_writes')
+            return RoutingState()
+        state = RoutingState(pick_replica())
+        routing_stats.record(state.read_alias)
+        return state
+
+    def remember_write(self, request, state):
+        if state.wrote and settings.READ_DATABASES:
+            client = self.client_key(request)
+            if client is not None:
+                cache.set(client, PRIMARY, timeout=settings.READ_YOUR_WRITES_SECONDS)
+
+    def client_key(self, request):
+        credential = request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if not credential:
+            return None
+        return f'read-your-writes:{hashlib.md5(credential.encode()).hexdigest()}'
@@ -0,0 +1,39 @@
+# Generated by Django 4.1 on 2026-10-18 12:51
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def populate_aggregates(apps, schema_editor):
+    Project = apps.get_model('todo_app', 'Project')
+    projects = Project.objects.annotate(
+        task_count=Count('tasks'),
+        pct_total=Sum('tasks__task_pct_complete'),
+        completed_count=Count('tasks', filter=Q(tasks__task_completed=True)),
+    )
+    for project in projects:
+        project.project_no_tasks = project.task_count
+        project.project_pct_total = project.pct_total or 0
+        project.project_completed_tasks = project.completed_count
+        project.save(update_fields=['project_no_tasks', 'project_pct_total', 'project_completed_tasks'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo_app', '0002_alter_assigneduser_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='project_completed_tasks',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='project_pct_total',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_aggregates, migrations.RunPython.noop),
+    ]
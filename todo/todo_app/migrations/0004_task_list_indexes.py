@@ -0,0 +1,25 @@
+# Generated by Django 4.1 on 2026-10-18 12:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo_app', '0003_project_progress_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'task_due_date', 'id'], name='task_project_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'task_completed', 'task_due_date', 'id'], name='task_project_done_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'task_owner', 'task_due_date', 'id'], name='task_project_owner_due_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-18 12:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo_app', '0004_task_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='project_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.1 on 2026-10-18 13:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo_app', '0005_project_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('queued_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pending_rollup', to='todo_app.project')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-18 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo_app', '0006_pending_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='task_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
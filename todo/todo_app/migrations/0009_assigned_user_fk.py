@@ -0,0 +1,79 @@
+# Generated by Django 4.1 on 2026-10-18 14:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Point each assignment at the user with its username. Assignments of usernames that no longer exist, and
+# repeats of an assignment, cannot satisfy the foreign key and the unique constraint and are dropped.
+def link_users(apps, schema_editor):
+    AssignedUser = apps.get_model('todo_app', 'AssignedUser')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    user_ids = dict(User.objects.values_list('username', 'pk'))
+    seen = set()
+    orphans = []
+    for assignment in AssignedUser.objects.order_by('pk'):
+        key = (assignment.project_id, user_ids.get(assignment.username))
+        if key[1] is None or key in seen:
+            orphans.append(assignment.pk)
+            continue
+        seen.add(key)
+        assignment.user_id = key[1]
+        assignment.save(update_fields=['user'])
+    AssignedUser.objects.filter(pk__in=orphans).delete()
+
+
+def unlink_users(apps, schema_editor):
+    AssignedUser = apps.get_model('todo_app', 'AssignedUser')
+    for assignment in AssignedUser.objects.select_related('user'):
+        assignment.username = assignment.user.username
+        assignment.save(update_fields=['username'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('todo_app', '0008_change_tracking'),
+    ]
+
+    # The username column is made nullable before it is set aside, so unapplying the migration can add it back
+    # to a table with rows and fill it in
+    operations = [
+        migrations.AlterField(
+            model_name='assigneduser',
+            name='user',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.RenameField(
+            model_name='assigneduser',
+            old_name='user',
+            new_name='username',
+        ),
+        migrations.AddField(
+            model_name='assigneduser',
+            name='user',
+            field=models.ForeignKey(null=True, db_index=False, on_delete=django.db.models.deletion.CASCADE,
+                                    related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(link_users, unlink_users),
+        migrations.RemoveField(
+            model_name='assigneduser',
+            name='username',
+        ),
+        migrations.AlterField(
+            model_name='assigneduser',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE,
+                                    related_name='assignments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='assigneduser',
+            constraint=models.UniqueConstraint(fields=('project', 'user'), name='assigned_user_project_user_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='assigneduser',
+            index=models.Index(fields=['user', 'project'], name='assigned_user_user_project_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.1 on 2026-10-18 13:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('todo_app', '0009_assigned_user_fk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedProject',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('project_name', models.CharField(max_length=50)),
+                ('project_description', models.CharField(max_length=200)),
+                ('project_created_date', models.DateField()),
+                ('project_pct_complete', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('project_due_date', models.DateField()),
+                ('project_no_tasks', models.IntegerField()),
+                ('project_completed', models.BooleanField()),
+                ('project_pct_total', models.IntegerField()),
+                ('project_completed_tasks', models.IntegerField()),
+                ('project_version', models.PositiveIntegerField()),
+                ('project_updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('project_owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_projects', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedTask',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('task_name', models.CharField(max_length=50)),
+                ('task_notes', models.CharField(max_length=200)),
+                ('task_created_date', models.DateField()),
+                ('task_last_update', models.DateField()),
+                ('task_pct_complete', models.PositiveIntegerField()),
+                ('task_due_date', models.DateField()),
+                ('task_completed', models.BooleanField()),
+                ('task_version', models.PositiveIntegerField()),
+                ('task_updated_at', models.DateTimeField()),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to='todo_app.archivedproject')),
+                ('task_owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_tasks', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedAssignedUser',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('assignment_updated_at', models.DateTimeField()),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assigned_users', to='todo_app.archivedproject')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_assignments', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,70 @@
+from django.db import migrations
+
+# The search indexes as they were when this migration was written, todo_app.search reinstalls the current ones
+# after every migrate
+INSTALL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS todo_app_project_fts USING fts5(project_name, project_description, "
+    "content='todo_app_project', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    'CREATE TRIGGER IF NOT EXISTS todo_app_project_fts_insert AFTER INSERT ON todo_app_project BEGIN '
+    'INSERT INTO todo_app_project_fts(rowid, project_name, project_description) '
+    'VALUES (new.id, new.project_name, new.project_description); END',
+    'CREATE TRIGGER IF NOT EXISTS todo_app_project_fts_delete AFTER DELETE ON todo_app_project BEGIN '
+    'INSERT INTO todo_app_project_fts(todo_app_project_fts, rowid, project_name, project_description) '
+    "VALUES ('delete', old.id, old.project_name, old.project_description); END",
+    'CREATE TRIGGER IF NOT EXISTS todo_app_project_fts_update AFTER UPDATE OF project_name, project_description '
+    'ON todo_app_project WHEN old.project_name IS NOT new.project_name '
+    'OR old.project_description IS NOT new.project_description BEGIN '
+    'INSERT INTO todo_app_project_fts(todo_app_project_fts, rowid, project_name, project_description) '
+    "VALUES ('delete', old.id, old.project_name, old.project_description); "
+    'INSERT INTO todo_app_project_fts(rowid, project_name, project_description) '
+    'VALUES (new.id, new.project_name, new.project_description); END',
+    "INSERT INTO todo_app_project_fts(todo_app_project_fts) VALUES ('rebuild')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS todo_app_task_fts USING fts5(task_name, task_notes, "
+    "content='todo_app_task', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    'CREATE TRIGGER IF NOT EXISTS todo_app_task_fts_insert AFTER INSERT ON todo_app_task BEGIN '
+    'INSERT INTO todo_app_task_fts(rowid, task_name, task_notes) VALUES (new.id, new.task_name, new.task_notes); '
+    'END',
+    'CREATE TRIGGER IF NOT EXISTS todo_app_task_fts_delete AFTER DELETE ON todo_app_task BEGIN '
+    'INSERT INTO todo_app_task_fts(todo_app_task_fts, rowid, task_name, task_notes) '
+    "VALUES ('delete', old.id, old.task_name, old.task_notes); END",
+    'CREATE TRIGGER IF NOT EXISTS todo_app_task_fts_update AFTER UPDATE OF task_name, task_notes ON todo_app_task '
+    'WHEN old.task_name IS NOT new.task_name OR old.task_notes IS NOT new.task_notes BEGIN '
+    'INSERT INTO todo_app_task_fts(todo_app_task_fts, rowid, task_name, task_notes) '
+    "VALUES ('delete', old.id, old.task_name, old.task_notes); "
+    'INSERT INTO todo_app_task_fts(rowid, task_name, task_notes) VALUES (new.id, new.task_name, new.task_notes); '
+    'END',
+    "INSERT INTO todo_app_task_fts(todo_app_task_fts) VALUES ('rebuild')",
+]
+
+UNINSTALL = [
+    'DROP TRIGGER IF EXISTS todo_app_project_fts_insert',
+    'DROP TRIGGER IF EXISTS todo_app_project_fts_delete',
+    'DROP TRIGGER IF EXISTS todo_app_project_fts_update',
+    'DROP TABLE IF EXISTS todo_app_project_fts',
+    'DROP TRIGGER IF EXISTS todo_app_task_fts_insert',
+    'DROP TRIGGER IF EXISTS todo_app_task_fts_delete',
+    'DROP TRIGGER IF EXISTS todo_app_task_fts_update',
+    'DROP TABLE IF EXISTS todo_app_task_fts',
+]
+
+
+# The FTS5 tables and triggers are SQLite only, other databases get no search index
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        with schema_editor.connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo_app', '0010_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(INSTALL), run(UNINSTALL)),
+    ]
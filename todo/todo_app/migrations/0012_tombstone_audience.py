@@ -0,0 +1,26 @@
+# Generated by Django 4.1 on 2026-10-18 13:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('todo_app', '0011_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tombstone',
+            name='project_pk',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -12,6 +12,13 @@ class Project(models.Model):
     project_due_date = models.DateField()
     project_no_tasks = models.IntegerField(default=0)
     project_completed = models.BooleanField(default=False)
+    # Running aggregates of the project's tasks, adjusted by the delta of each task write
+    project_pct_total = models.IntegerField(default=0)
+    project_completed_tasks = models.IntegerField(default=0)
+    # Changed by every write to the project, its tasks or its assigned users
+    project_version = models.PositiveIntegerField(default=0)
+    # Time of the last change, the cursor of the changes feed. Set by every write that bumps the version.
+    project_updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.project_name
@@ -27,15 +34,115 @@ class Task(models.Model):
     task_pct_complete = models.PositiveIntegerField(validators=[MinValueValidator(0), MaxValueValidator(100)])
     task_due_date = models.DateField()
     task_completed = models.BooleanField(default=False)
+    task_version = models.PositiveIntegerField(default=0)  # optimistic concurrency check of updates
+    task_updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        # Composite indexes matching the keyset ordering of the task list and its filters
+        indexes = [
+            models.Index(fields=['project', 'task_due_date', 'id'], name='task_project_due_idx'),
+            models.Index(fields=['project', 'task_completed', 'task_due_date', 'id'], name='task_project_done_due_idx'),
+            models.Index(fields=['project', 'task_owner', 'task_due_date', 'id'], name='task_project_owner_due_idx'),
+        ]
 
     def __str__(self):
         return self.task_name
 
 
+# Project whose rollups are waiting to be recomputed by the process_rollups command
+class PendingRollup(models.Model):
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, related_name='pending_rollup')
+    queued_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return str(self.project_id)
+
+
 class AssignedUser(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='assigned_users')
-    user = models.CharField(max_length=50)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='assignments', db_index=False)
+    assignment_updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'user'], name='assigned_user_project_user_uniq'),
+        ]
+        # Projects a user is assigned to, answered from the index alone (the unique constraint covers the
+        # lookups by project)
+        indexes = [
+            models.Index(fields=['user', 'project'], name='assigned_user_user_project_idx'),
+        ]
+
+    def __str__(self):
+        return str(self.user)
+
+
+# Project, task or assigned user that was deleted, so the changes feed can tell clients to drop it
+class Tombstone(models.Model):
+    PROJECT = 'project'
+    TASK = 'task'
+    ASSIGNED_USER = 'assigned_user'
+    MODEL_CHOICES = [(PROJECT, 'Project'), (TASK, 'Task'), (ASSIGNED_USER, 'Assigned user')]
+
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.IntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Project of the deleted object (the project itself for projects), the users who can see the project are
+    # shown the deletion
+    project_pk = models.IntegerField(null=True)
+    # User who could see the object but not its project any more, also shown the deletion: the owner and each
+    # assigned user of a deleted project get a tombstone of their own, the user of a deleted assignment too
+    user = models.ForeignKey(User, null=True, on_delete=models.CASCADE, related_name='+')
+
+    def __str__(self):
+        return f'{self.model} {self.object_id}'
+
+
+# Cold copies of completed projects moved out of the hot tables by `manage.py archive_projects`, with their
+# tasks and assigned users. Rows keep the ids and values they had, date fields are not auto-set here.
+class ArchivedProject(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    project_owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_projects')
+    project_name = models.CharField(max_length=50)
+    project_description = models.CharField(max_length=200)
+    project_created_date = models.DateField()
+    project_pct_complete = models.DecimalField(max_digits=5, decimal_places=2)
+    project_due_date = models.DateField()
+    project_no_tasks = models.IntegerField()
+    project_completed = models.BooleanField()
+    project_pct_total = models.IntegerField()
+    project_completed_tasks = models.IntegerField()
+    project_version = models.PositiveIntegerField()
+    project_updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
-        return self.user
+        return self.project_name
 
+
+class ArchivedTask(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    task_owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_tasks')
+    task_name = models.CharField(max_length=50)
+    task_notes = models.CharField(max_length=200)
+    project = models.ForeignKey(ArchivedProject, on_delete=models.CASCADE, related_name='tasks')
+    task_created_date = models.DateField()
+    task_last_update = models.DateField()
+    task_pct_complete = models.PositiveIntegerField()
+    task_due_date = models.DateField()
+    task_completed = models.BooleanField()
+    task_version = models.PositiveIntegerField()
+    task_updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.task_name
+
+
+class ArchivedAssignedUser(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    project = models.ForeignKey(ArchivedProject, on_delete=models.CASCADE, related_name='assigned_users')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_assignments')
+    assignment_updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return str(self.user)
@@ -0,0 +1,132 @@
+import base64
+from collections import OrderedDict
+from datetime import date
+
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class ProjectPagination(PageNumberPagination):
+    page_size = getattr(settings, 'PROJECT_LIST_PAGE_SIZE', 20)
+    page_size_query_param = 'page_size'  # client may ask for a different page size...
+    max_page_size = getattr(settings, 'PROJECT_LIST_MAX_PAGE_SIZE', 100)  # ...up to this limit
+
+    # paginate_queryset for the async views: the count and the rows of the page come from the async ORM, the
+    # Django paginator only does the page arithmetic
+    async def apaginate_queryset(self, queryset, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+        paginator = self.django_paginator_class(range(await queryset.acount()), page_size)
+        page_number = request.query_params.get(self.page_query_param, 1)
+        if page_number in self.last_page_strings:
+            page_number = paginator.num_pages
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        bottom = (self.page.number - 1) * page_size
+        return [row async for row in queryset[bottom:bottom + page_size]]
+
+
+# Keyset pagination on (task_due_date, id). The cursor holds the key of the last task of the page and
+# the next page starts straight after it, so deep pages cost the same as the first one.
+class TaskKeysetPagination(BasePagination):
+    page_size = getattr(settings, 'TASK_LIST_PAGE_SIZE', 50)
+    max_page_size = getattr(settings, 'TASK_LIST_MAX_PAGE_SIZE', 500)
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        return self.set_page([row async for row in self.page_queryset(queryset, request)])
+
+    # Rows of the page, with one extra row to find out if there is a next page
+    def page_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by('task_due_date', 'id')
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            due_date, pk = cursor
+            queryset = queryset.filter(Q(task_due_date__gt=due_date) | Q(task_due_date=due_date, id__gt=pk))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        if isinstance(last, dict):  # values() rows of the fast read path
+            due_date, pk = last['task_due_date'], last['id']
+        else:
+            due_date, pk = last.task_due_date, last.pk
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(due_date, pk))
+
+    def encode_cursor(self, due_date, pk):
+        return base64.urlsafe_b64encode(f'{due_date.isoformat()}|{pk}'.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            due_date, pk = base64.urlsafe_b64decode(encoded.encode()).decode().split('|')
+            return date.fromisoformat(due_date), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+# Offset pagination of search results without a count, the next page link is given when the page came back
+# with one extra result
+class SearchPagination(TaskKeysetPagination):
+    page_size = getattr(settings, 'SEARCH_PAGE_SIZE', 20)
+    max_page_size = getattr(settings, 'SEARCH_MAX_PAGE_SIZE', 100)
+    max_offset = getattr(settings, 'SEARCH_MAX_OFFSET', 1000)
+    offset_query_param = 'offset'
+
+    # (limit, offset) of the results to fetch for the page
+    def get_limits(self, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        try:
+            self.offset = max(int(request.query_params.get(self.offset_query_param, 0)), 0)
+        except ValueError:
+            raise NotFound('Invalid offset')
+        if self.offset > self.max_offset:
+            raise NotFound(f'Search results are only paged up to offset {self.max_offset}, refine the search')
+        return self.page_size + 1, self.offset
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.offset_query_param, self.offset + self.page_size)
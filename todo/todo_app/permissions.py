@@ -1,5 +1,10 @@
+import logging
+
 from rest_framework import permissions
-from todo_app.models import Project, AssignedUser, Task
+from todo_app.models import AssignedUser
+from todo_app.loaders import get_project, get_task, aget_project, aget_task
+
+logger = logging.getLogger(__name__)
 
 
 # If user is Admin can edit otherwise read only.
@@ -17,19 +22,24 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
 
     def has_permission(self, request, view):  # has_object_permission as refers to specific object access
         if request.method in permissions.SAFE_METHODS or request.user.is_staff:  # SAFE_METHODS are Read Only Requests (e.g. GET)
-            print(request.user)
             return True
         else:
             task_pk = view.kwargs['pk']
-            task = Task.objects.get(pk=task_pk)
-            print(request.user)
-            print(task.task_owner)
-            print(task.project.project_owner)
+            task = get_task(request, task_pk)
+            logger.debug('task write permission: user=%s task=%s task_owner=%s project_owner=%s',
+                         request.user, task.pk, task.task_owner, task.project.project_owner)
             if request.user == task.task_owner or request.user == task.project.project_owner:
                 return True
             else:
                 return False
 
+    # has_permission for the async views, loading the task through the async ORM
+    async def ahas_permission(self, request, view):
+        if request.method in permissions.SAFE_METHODS or request.user.is_staff:
+            return True
+        task = await aget_task(request, view.kwargs['pk'])
+        return request.user == task.task_owner or request.user == task.project.project_owner
+
 
 class IsProjectOwner(permissions.BasePermission):
     message = 'Permission denied. You must be the project owner or Admin.'
@@ -39,7 +49,13 @@ class IsProjectOwner(permissions.BasePermission):
             return True
         else:
             project_pk = view.kwargs['pk']  # get pk of project passed from url
-            project = Project.objects.get(pk=project_pk)
+            project = get_project(request, project_pk)
+        return request.user == project.project_owner
+
+    async def ahas_permission(self, request, view):
+        if request.method in permissions.SAFE_METHODS or request.user.is_staff:
+            return True
+        project = await aget_project(request, view.kwargs['pk'])
         return request.user == project.project_owner
 
 
@@ -48,13 +64,19 @@ class IsAssignedToProject(permissions.BasePermission):
 
     def has_permission(self, request, view):
         project_pk = view.kwargs['pk']  # get pk of project passed from url
-        project = Project.objects.get(pk=project_pk)
+        project = get_project(request, project_pk)
 
         if project.project_owner == request.user:
             return True
         else:
             return AssignedUser.objects.filter(project=project_pk, user=request.user).exists()
 
+    async def ahas_permission(self, request, view):
+        project = await aget_project(request, view.kwargs['pk'])
+        if project.project_owner == request.user:
+            return True
+        return await AssignedUser.objects.filter(project=project.pk, user=request.user).aexists()
+
 
 
 
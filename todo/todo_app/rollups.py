@@ -0,0 +1,135 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from todo_app import events
+from todo_app.models import PendingRollup
+from todo_app.utils import apply_task_delta, update_project_fields
+
+logger = logging.getLogger(__name__)
+
+REBUILT_KEPT = 600  # seconds a rebuild is remembered, for the deltas of transactions open at the time
+
+
+# Project rollups (task count, percent complete, completed flag) after task writes are recomputed according
+# to PROJECT_ROLLUP_MODE:
+#   'sync'   in the request, the default and what tests should use
+#   'thread' after the write commits, deltas are queued in memory and a worker thread applies all the deltas
+#            of a project collected during PROJECT_ROLLUP_DEBOUNCE seconds with one UPDATE
+#   'queue'  the project is marked in the PendingRollup table and `manage.py process_rollups` recomputes each
+#            marked project once
+# In the deferred modes the project progress and version lag the task rows by up to the debounce window.
+def task_changed(project_pk, tasks=0, pct=0, completed=0):
+    mode = settings.PROJECT_ROLLUP_MODE
+    if mode == 'thread':
+        queued_at = time.monotonic()  # before the write commits, see RollupWorker.add
+        transaction.on_commit(lambda: worker.add(project_pk, tasks=tasks, pct=pct, completed=completed,
+                                                 queued_at=queued_at))
+    elif mode == 'queue':
+        mark_pending(project_pk)
+    else:
+        apply_rollup(project_pk, tasks=tasks, pct=pct, completed=completed)
+
+
+# Tasks of a project changed in ways not described by a delta (batch writes), recompute from the task table
+def project_changed(project_pk):
+    mode = settings.PROJECT_ROLLUP_MODE
+    if mode == 'thread':
+        transaction.on_commit(lambda: worker.add(project_pk, rebuild=True))
+    elif mode == 'queue':
+        mark_pending(project_pk)
+    else:
+        apply_rollup(project_pk, rebuild=True)
+
+
+def mark_pending(project_pk):
+    # Ignoring conflicts keeps the time of the first write, which starts the debounce window
+    PendingRollup.objects.bulk_create([PendingRollup(project_id=project_pk)], ignore_conflicts=True)
+
+
+# Apply the rollup of one project and push the new progress to its event streams. Both are plain UPDATEs,
+# a project deleted since the write was queued is simply not matched. Rollups applied by process_rollups
+# only reach the streams of that process.
+def apply_rollup(project_pk, tasks=0, pct=0, completed=0, rebuild=False):
+    if rebuild:
+        update_project_fields(project_pk)
+    else:
+        apply_task_delta(project_pk, tasks=tasks, pct=pct, completed=completed)
+    events.progress_changed(project_pk)
+
+
+# A rebuild counts every task committed before its UPDATE, so the delta of a write that may have committed
+# before a rebuild of its project ended is not added on top: the project is rebuilt again instead. Deltas
+# carry the time of the write (queued_at), taken before its commit.
+class RollupWorker:
+
+    def __init__(self, debounce):
+        self.debounce = debounce
+        self._pending = {}  # project pk -> {'due': ..., 'tasks': ..., 'pct': ..., 'completed': ..., 'rebuild': ...}
+        self._rebuilding = set()  # project pks of the rebuilds taken and not applied yet
+        self._rebuilt = {}  # project pk -> time the last rebuild was applied
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def add(self, project_pk, tasks=0, pct=0, completed=0, rebuild=False, queued_at=None):
+        with self._condition:
+            if project_pk in self._rebuilding or self._rebuilt.get(project_pk, 0) > (queued_at or 0):
+                rebuild = True
+            entry = self._pending.setdefault(project_pk, {
+                'due': time.monotonic() + self.debounce, 'tasks': 0, 'pct': 0, 'completed': 0, 'rebuild': False,
+            })
+            entry['tasks'] = entry['tasks'] + tasks
+            entry['pct'] = entry['pct'] + pct
+            entry['completed'] = entry['completed'] + completed
+            entry['rebuild'] = entry['rebuild'] or rebuild
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name='project-rollups', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def take(self, everything=False):
+        with self._condition:
+            now = time.monotonic()
+            due = {pk: entry for pk, entry in self._pending.items() if everything or entry['due'] <= now}
+            for pk, entry in due.items():
+                del self._pending[pk]
+                if entry['rebuild']:
+                    self._rebuilding.add(pk)
+            self._rebuilt = {pk: end for pk, end in self._rebuilt.items() if end > now - REBUILT_KEPT}
+            return due
+
+    def apply(self, due):
+        for project_pk, entry in due.items():
+            try:
+                apply_rollup(project_pk, tasks=entry['tasks'], pct=entry['pct'], completed=entry['completed'],
+                             rebuild=entry['rebuild'])
+            except Exception:
+                logger.exception('project rollup failed: project=%s', project_pk)
+            if entry['rebuild']:
+                with self._condition:
+                    self._rebuilding.discard(project_pk)
+                    self._rebuilt[project_pk] = time.monotonic()
+        close_old_connections()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                wait = min(entry['due'] for entry in self._pending.values()) - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+            self.apply(self.take())
+
+    # Apply everything still queued without waiting for the debounce window
+    def flush(self):
+        self.apply(self.take(everything=True))
+
+
+worker = RollupWorker(debounce=getattr(settings, 'PROJECT_ROLLUP_DEBOUNCE', 0.5))
+atexit.register(worker.flush)
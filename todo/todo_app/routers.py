@@ -0,0 +1,82 @@
+import random
+import threading
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY = 'default'
+
+
+# Database routing of the request in progress, set by ReadReplicaMiddleware. read_alias is the replica its
+# reads go to, None to read from the primary. Kept as a mutable object so a write flagged by the router in
+# the thread of a sync view is seen by the middleware in the async request path.
+class RoutingState:
+
+    def __init__(self, read_alias=None):
+        self.read_alias = read_alias
+        self.wrote = False
+
+
+routing = ContextVar('todo_routing', default=None)
+
+
+# Sends reads to the replica picked for the request and every write to the primary. Reads outside a request
+# (management commands, the rollup worker, event publishing) and reads after the request wrote anything go
+# to the primary, so they always see the latest writes.
+class ReadReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = routing.get()
+        if state is None or state.read_alias is None or state.wrote:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db is not None:
+            return instance._state.db  # related objects come from the database their instance came from
+        return state.read_alias
+
+    def db_for_write(self, model, **hints):
+        state = routing.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = [PRIMARY, *settings.READ_DATABASES]
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    # Replicas get their schema from the primary
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.READ_DATABASES:
+            return False
+        return None
+
+
+def reading_from_replica():
+    state = routing.get()
+    return state is not None and state.read_alias is not None and not state.wrote
+
+
+# Database the reads of each request were routed to, for the stats endpoint
+class RoutingStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter()
+
+    def record(self, alias):
+        with self._lock:
+            self.requests[alias] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.requests)
+
+
+routing_stats = RoutingStats()
+
+
+def pick_replica():
+    return random.choice(settings.READ_DATABASES)
@@ -0,0 +1,125 @@
+import re
+
+from django.db import connections, router
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from todo_app.models import Project
+
+# Full-text indexes as name -> (table, FTS5 table, indexed columns). The FTS5 tables are external content
+# tables: they hold only the index, the text is read from the table itself, and triggers on the table keep
+# them in sync. Names are weighted above descriptions and notes by the ranking.
+INDEXES = {
+    'projects': ('todo_app_project', 'todo_app_project_fts', ['project_name', 'project_description']),
+    'tasks': ('todo_app_task', 'todo_app_task_fts', ['task_name', 'task_notes']),
+}
+
+RESULT_TYPES = {'projects': 'project', 'tasks': 'task'}
+
+MAX_TERMS = 20
+
+
+# Statements creating the FTS5 tables and their triggers, none of them fails when the object already exists
+def index_statements(table, fts_table, columns):
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    changed = ' OR '.join(f'old.{column} IS NOT new.{column}' for column in columns)
+    delete = f"INSERT INTO {fts_table}({fts_table}, rowid, {names}) VALUES ('delete', old.id, {old});"
+    insert = f'INSERT INTO {fts_table}(rowid, {names}) VALUES (new.id, {new});'
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5({names}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts_table}_insert AFTER INSERT ON {table} BEGIN {insert} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts_table}_delete AFTER DELETE ON {table} BEGIN {delete} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts_table}_update AFTER UPDATE OF {names} ON {table} '
+        f'WHEN {changed} BEGIN {delete} {insert} END',
+    ]
+
+
+def index_objects(db):
+    with db.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE '%_fts%'")
+        return {name for name, in cursor.fetchall()}
+
+
+# Create the indexes and triggers that are missing. SQLite drops the triggers of a table when a migration
+# rebuilds it, so this runs after every migrate (see todo_app.signals) and rebuilds an index whose table or
+# triggers had to be created again. Returns the names of the indexes rebuilt.
+def install(db):
+    if db.vendor != 'sqlite':
+        return []
+    existing = index_objects(db)
+    rebuilt = []
+    with db.cursor() as cursor:
+        for name, (table, fts_table, columns) in INDEXES.items():
+            wanted = {fts_table, f'{fts_table}_insert', f'{fts_table}_delete', f'{fts_table}_update'}
+            if wanted <= existing:
+                continue
+            for statement in index_statements(table, fts_table, columns):
+                cursor.execute(statement)
+            cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+            rebuilt.append(name)
+    return rebuilt
+
+
+def uninstall(db):
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        for table, fts_table, columns in INDEXES.values():
+            for trigger in ('insert', 'delete', 'update'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {fts_table}_{trigger}')
+            cursor.execute(f'DROP TABLE IF EXISTS {fts_table}')
+
+
+# Rebuild every index from its table and merge its segments, for `manage.py rebuild_search_index`
+def rebuild(db):
+    install(db)
+    with db.cursor() as cursor:
+        for table, fts_table, columns in INDEXES.values():
+            cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+            cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('optimize')")
+
+
+class SearchUnavailable(APIException):
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = 'Search needs the SQLite FTS5 index, which this database does not have.'
+    default_code = 'search_unavailable'
+
+
+# FTS5 query matching every word of the search text, the last one as a prefix so partial words match while
+# typing. Words are quoted, the FTS5 query syntax of the text is not interpreted.
+def match_query(text):
+    words = re.findall(r'\w+', text)[:MAX_TERMS]
+    if not words:
+        raise ValidationError({'q': 'Give at least one word to search for'})
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+# Projects and tasks matching `text`, best match first, as dicts with the type, id, project, name and text of
+# each. projects: queryset of the projects whose results may be returned, None for all of them.
+def search(text, names, projects=None, limit=20, offset=0):
+    # Read from the database the router picks for projects, the replicas are copies with the indexes
+    connection = connections[router.db_for_read(Project)]
+    if connection.vendor != 'sqlite':
+        raise SearchUnavailable()
+    query = match_query(text)
+    selects, params = [], []
+    for name in names:
+        table, fts_table, columns = INDEXES[name]
+        project = 'id' if name == 'projects' else 'project_id'
+        sql = (f"SELECT '{RESULT_TYPES[name]}' AS type, t.id, t.{project} AS project, t.{columns[0]} AS name, "
+               f't.{columns[1]} AS text, bm25({fts_table}, 10.0, 1.0) AS score '
+               f'FROM {fts_table} JOIN {table} t ON t.id = {fts_table}.rowid WHERE {fts_table} MATCH %s')
+        params.append(query)
+        if projects is not None:
+            visible, visible_params = projects.values('pk').query.sql_with_params()
+            sql = f'{sql} AND t.{project} IN ({visible})'
+            params.extend(visible_params)
+        selects.append(sql)
+    sql = f'SELECT * FROM ({" UNION ALL ".join(selects)}) ORDER BY score, type, id LIMIT %s OFFSET %s'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, limit, offset])
+        return [{'type': type_, 'id': pk, 'project': project, 'name': name, 'text': text, 'score': -score}
+                for type_, pk, project, name, text, score in cursor.fetchall()]
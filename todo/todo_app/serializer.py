@@ -2,7 +2,7 @@ from rest_framework import serializers
 # from django.contrib.auth.models import User
 from datetime import date
 
-from todo_app.models import Project, Task, AssignedUser
+from todo_app.models import Project, Task, AssignedUser, ArchivedProject, ArchivedTask, ArchivedAssignedUser
 
 
 class TaskSerializer(serializers.ModelSerializer):
@@ -14,9 +14,19 @@ class TaskSerializer(serializers.ModelSerializer):
         exclude = ('project',)
         extra_kwargs = {
             'task_completed': {"read_only": True},
+            'task_version': {"read_only": True},
         }
 
 
+# Task of the tasks across projects of /projects/mine/, with the id of its project
+class MyTaskSerializer(TaskSerializer):
+    project = serializers.IntegerField(source='project_id', read_only=True)
+
+    class Meta(TaskSerializer.Meta):
+        exclude = None
+        fields = '__all__'
+
+
 class TaskDetailSerializer(serializers.ModelSerializer):
     project = serializers.StringRelatedField(read_only=True)
     task_owner = serializers.StringRelatedField(read_only=True)
@@ -25,6 +35,7 @@ class TaskDetailSerializer(serializers.ModelSerializer):
         fields = "__all__"
         extra_kwargs = {
             'task_completed': {"read_only": True},
+            'task_version': {"read_only": True},
         }
 
 
@@ -36,7 +47,11 @@ class AssignUserSerializer(serializers.ModelSerializer):
         exclude = ('project',)
 
 
+PROJECT_BOOKKEEPING_FIELDS = ('project_pct_total', 'project_completed_tasks', 'project_version')
+
+
 class ProjectSerializer(serializers.ModelSerializer):
+    expandable_fields = ('tasks', 'assigned_users')
     project_owner = serializers.StringRelatedField(read_only=True)
     tasks = TaskSerializer(many=True, read_only=True)
     assigned_users = AssignUserSerializer(many=True, read_only=True)
@@ -48,13 +63,26 @@ class ProjectSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Project
-        fields = "__all__"
+        # The running aggregates behind the progress fields and the version behind the ETag are bookkeeping
+        exclude = PROJECT_BOOKKEEPING_FIELDS
         extra_kwargs = {
             'project_pct_complete': {"read_only": True},
             'project_no_tasks': {"read_only": True},
             'project_completed': {"read_only": True},
         }
 
+    # fields: names of the fields to return, expand: nested relations to embed. When neither is given the
+    # whole project is returned with every relation embedded.
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None and expand is None:
+            return
+        keep = set(self.fields if fields is None else fields).difference(self.expandable_fields)
+        keep.update(expand or ())
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
+
     def validate_project_due_date(self, value):
         if value < date.today():
             raise serializers.ValidationError({"error": "Project Due Date is in the past!"})
@@ -62,4 +90,31 @@ class ProjectSerializer(serializers.ModelSerializer):
             return value
 
 
+# Read-only views of the archive tables, with the fields of the hot serializers above
+class ArchivedTaskSerializer(serializers.ModelSerializer):
+    task_owner = serializers.StringRelatedField(read_only=True)
+
+    class Meta:
+        model = ArchivedTask
+        exclude = ('project',)
+
+
+class ArchivedAssignedUserSerializer(serializers.ModelSerializer):
+    user = serializers.StringRelatedField(read_only=True)
+
+    class Meta:
+        model = ArchivedAssignedUser
+        exclude = ('project',)
+
+
+class ArchivedProjectSerializer(serializers.ModelSerializer):
+    project_owner = serializers.StringRelatedField(read_only=True)
+
+    class Meta:
+        model = ArchivedProject
+        exclude = PROJECT_BOOKKEEPING_FIELDS
+
 
+class ArchivedProjectDetailSerializer(ArchivedProjectSerializer):
+    tasks = ArchivedTaskSerializer(many=True, read_only=True)
+    assigned_users = ArchivedAssignedUserSerializer(many=True, read_only=True)
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, pre_delete, post_delete, post_migrate
+from django.dispatch import receiver
+
+from todo_app import search
+from todo_app.models import Project, Task, AssignedUser, Tombstone
+from todo_app.utils import invalidate_project_cache
+
+
+# The cached responses are dropped once the write commits, a request rebuilding them before the commit
+# would cache the rows of before the write under the new list generation
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def project_changed(sender, instance=None, **kwargs):
+    invalidate_project_cache(instance.pk)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+@receiver(post_save, sender=AssignedUser)
+@receiver(post_delete, sender=AssignedUser)
+def project_child_changed(sender, instance=None, **kwargs):
+    invalidate_project_cache(instance.project_id)
+
+
+TOMBSTONE_MODELS = {
+    Project: Tombstone.PROJECT,
+    Task: Tombstone.TASK,
+    AssignedUser: Tombstone.ASSIGNED_USER,
+}
+
+
+# Users who could see a project about to be deleted, its assignments are gone by the time of post_delete
+@receiver(pre_delete, sender=Project)
+def remember_project_users(sender, instance=None, **kwargs):
+    assigned = AssignedUser.objects.filter(project=instance.pk).values_list('user_id', flat=True)
+    instance.tombstone_users = list(dict.fromkeys([instance.project_owner_id, *assigned]))
+
+
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=AssignedUser)
+def record_tombstone(sender, instance=None, origin=None, **kwargs):
+    # Tasks and assignments deleted along with their project, or projects of a queryset, are covered by the
+    # project's tombstone
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if sender is not Project and origin_model is Project:
+        return
+    model = TOMBSTONE_MODELS[sender]
+    if sender is Project:
+        users = getattr(instance, 'tombstone_users', [instance.project_owner_id])
+        Tombstone.objects.bulk_create([Tombstone(model=model, object_id=instance.pk, project_pk=instance.pk,
+                                                 user_id=user) for user in users])
+    else:
+        Tombstone.objects.create(model=model, object_id=instance.pk, project_pk=instance.project_id,
+                                 user_id=instance.user_id if sender is AssignedUser else None)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    cursor = connection.connection.cursor()  # the raw connection, cursor() would recurse into connecting
+    try:
+        for pragma, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+    finally:
+        cursor.close()
+
+
+# SQLite drops the triggers keeping the search indexes in sync when a migration rebuilds a table, put back
+# what is missing once migrations of the app were applied. Unapplying them leaves the indexes alone.
+@receiver(post_migrate)
+def install_search_index(sender, using='default', plan=None, **kwargs):
+    if sender.name != 'todo_app' or not any(not backwards for migration, backwards in plan or []):
+        return
+    connection = connections[using]
+    if {'todo_app_project', 'todo_app_task'} <= set(connection.introspection.table_names()):
+        search.install(connection)
@@ -1,3 +1,977 @@
-from django.test import TestCase
+import contextlib
+import csv
+import json
+import os
+import tempfile
+import threading
+import uuid
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
+
+from todo_app import events, fast_serializer, rollups, throttling
+from todo_app.cache import response_cache
+from todo_app.management.commands import rebuild_project_progress
+from todo_app.models import ArchivedProject, ArchivedTask, AssignedUser, Project, Task
+from todo_app.parsers import ORJSONParser
+from todo_app.renderers import ORJSONRenderer
+from todo_app.routers import ReadReplicaRouter, RoutingState, routing, routing_stats
+from todo_app.serializer import AssignUserSerializer, MyTaskSerializer, ProjectSerializer, TaskDetailSerializer, \
+    TaskSerializer
+from todo_app.utils import PROGRESS_FIELDS, apply_task_delta, update_project_fields
+from todo_app.views import ProjectDetail, TaskBulk
+
+
+# Users, projects and tasks made through the API, with the caches and throttle windows of earlier tests
+# cleared
+class TodoTestMixin:
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        throttling.store().clear()
+        self.owner = self.create_user('owner')
+
+    def create_user(self, username, staff=False):
+        return User.objects.create_user(username, f'{username}@example.com', 'password', is_staff=staff)
+
+    def login(self, user, client=None):
+        token, created = Token.objects.get_or_create(user=user)
+        (client or self.client).credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def write(self, method, url, data=None, user=None):
+        self.login(user or self.owner)
+        with self.committing():
+            return getattr(self.client, method)(url, data, format='json')
+
+    def read(self, url, user=None, **headers):
+        self.login(user or self.owner)
+        return self.client.get(url, **headers)
+
+    def due_date(self, days=30):
+        return (date.today() + timedelta(days=days)).isoformat()
+
+    def create_project(self, name='Project', user=None, description='Description'):
+        response = self.write('post', reverse('project-list'), {
+            'project_name': name, 'project_description': description, 'project_due_date': self.due_date(),
+        }, user=user)
+        return Project.objects.get(pk=response.data['id'])
+
+    def task_data(self, **extra):
+        return dict({'task_name': 'Task', 'task_notes': 'Notes', 'task_pct_complete': 0,
+                     'task_due_date': self.due_date()}, **extra)
+
+    def create_task(self, project, user=None, **extra):
+        response = self.write('post', reverse('task-create', kwargs={'pk': project.pk}), self.task_data(**extra),
+                              user=user)
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def update_task(self, task, user=None, **extra):
+        return self.write('put', reverse('task-details', kwargs={'pk': task['id']}), self.task_data(**extra),
+                          user=user)
+
+    def assertProgressRebuilt(self, project):
+        project.refresh_from_db()
+        stored = [getattr(project, field) for field in PROGRESS_FIELDS]
+        update_project_fields(project.pk)
+        project.refresh_from_db()
+        self.assertEqual(stored, [getattr(project, field) for field in PROGRESS_FIELDS])
+
+
+# Writes run their on-commit hooks (cache invalidation, rollups, events) as if they had committed
+class TodoTestCase(TodoTestMixin, APITestCase):
+
+    def committing(self):
+        return self.captureOnCommitCallbacks(execute=True)
+
+
+# Writes commit, for tests with requests in flight on several threads at once
+class TodoTransactionTestCase(TodoTestMixin, APITransactionTestCase):
+
+    def committing(self):
+        return contextlib.nullcontext()
+
+
+class ResponseCacheTests(TodoTestCase):
+
+    def project_row(self, project):
+        rows = self.read(reverse('project-list')).data['results']
+        return next(row for row in rows if row['id'] == project.pk)
+
+    def test_project_list_is_fresh_after_a_task_update(self):
+        project = self.create_project()
+        task = self.create_task(project)
+        self.assertEqual(self.project_row(project)['project_pct_complete'], '0.00')  # cached from here on
+
+        self.assertEqual(self.update_task(task, task_pct_complete=100).status_code, 200)
+        row = self.project_row(project)
+        self.assertEqual(row['project_pct_complete'], '100.00')
+        self.assertTrue(row['project_completed'])
+        self.assertEqual(row['tasks'][0]['task_pct_complete'], 100)
+
+    def test_project_detail_is_fresh_after_a_task_update(self):
+        project = self.create_project()
+        task = self.create_task(project)
+        url = reverse('project-details', kwargs={'pk': project.pk})
+        self.assertEqual(self.read(url).data['project_pct_complete'], '0.00')
+
+        self.update_task(task, task_pct_complete=50)
+        self.assertEqual(self.read(url).data['project_pct_complete'], '50.00')
+
+    def test_project_list_is_fresh_after_batch_writes(self):
+        project = self.create_project()
+        self.assertEqual(self.project_row(project)['project_no_tasks'], 0)
+
+        url = reverse('task-bulk', kwargs={'pk': project.pk})
+        tasks = self.write('post', url, [self.task_data(), self.task_data()]).data
+        self.assertEqual(self.project_row(project)['project_no_tasks'], 2)
+
+        self.write('put', url, [dict(self.task_data(task_pct_complete=100), id=task['id']) for task in tasks])
+        row = self.project_row(project)
+        self.assertEqual(row['project_pct_complete'], '100.00')
+        self.assertEqual([task['task_pct_complete'] for task in row['tasks']], [100, 100])
+
+
+    def test_cached_project_is_dropped_once_the_write_commits(self):
+        project = self.create_project()
+        self.read(reverse('project-details', kwargs={'pk': project.pk}))
+        key = f'project:{project.pk}'
+        self.assertIsNotNone(response_cache.cache.get(key))
+        with self.captureOnCommitCallbacks(execute=True):
+            project.project_name = 'Renamed'
+            project.save()
+            # Other connections still read the project of before the write
+            self.assertIsNotNone(response_cache.cache.get(key))
+        self.assertIsNone(response_cache.cache.get(key))
+
+
+class ProjectUpdateTests(TodoTestCase):
+
+    def test_update_keeps_task_deltas_applied_during_the_request(self):
+        project = self.create_project()
+        self.update_task(self.create_task(project), task_pct_complete=100)
+        get_object = ProjectDetail.get_object
+
+        # A task of another request lands after the project was loaded for the update
+        def load_then_concurrent_write(view):
+            loaded = get_object(view)
+            apply_task_delta(project.pk, tasks=1, pct=0)
+            return loaded
+
+        with mock.patch.object(ProjectDetail, 'get_object', load_then_concurrent_write):
+            response = self.write('put', reverse('project-details', kwargs={'pk': project.pk}), {
+                'project_name': 'Renamed', 'project_description': 'Changed', 'project_due_date': self.due_date(),
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['project_no_tasks'], response.data['project_pct_complete']), (2, '50.00'))
+        project.refresh_from_db()
+        self.assertEqual(project.project_name, 'Renamed')
+        self.assertEqual((project.project_no_tasks, project.project_pct_total), (2, 100))
+
+    def test_update_queries_do_not_grow_with_the_tasks(self):
+        project = self.create_project()
+        url = reverse('project-details', kwargs={'pk': project.pk})
+        data = {'project_name': 'Renamed', 'project_description': 'Changed', 'project_due_date': self.due_date()}
+        queries = []
+        for tasks in (1, 3):
+            for n in range(tasks):
+                self.create_task(project)
+            with CaptureQueriesContext(connection) as captured:
+                response = self.write('put', url, data)
+            queries.append(len(captured))
+        self.assertEqual(len(response.data['tasks']), 4)
+        self.assertEqual(queries[0], queries[1])
+
+
+class TaskBulkUpdateTests(TodoTestCase):
+
+    def test_batch_racing_another_write_changes_nothing(self):
+        project = self.create_project()
+        first, second = self.create_task(project), self.create_task(project)
+        get_tasks = TaskBulk.get_tasks
+
+        # Another request updates the second task after the batch loaded and checked it
+        def load_then_concurrent_write(view, request, project, ids):
+            loaded = get_tasks(view, request, project, ids)
+            Task.objects.filter(pk=second['id']).update(task_pct_complete=50, task_version=1)
+            return loaded
+
+        with mock.patch.object(TaskBulk, 'get_tasks', load_then_concurrent_write):
+            response = self.write('put', reverse('task-bulk', kwargs={'pk': project.pk}),
+                                  [dict(self.task_data(task_pct_complete=100), id=task['id'])
+                                   for task in (first, second)])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['task_version'], {second['id']: 1})
+        self.assertEqual(list(Task.objects.order_by('pk').values_list('task_pct_complete', 'task_version')),
+                         [(0, 0), (50, 1)])
+
+    def test_batch_updates_versions(self):
+        project = self.create_project()
+        task = self.create_task(project)
+        url = reverse('task-bulk', kwargs={'pk': project.pk})
+        response = self.write('put', url, [dict(self.task_data(task_pct_complete=100), id=task['id'], task_version=0)])
+        self.assertEqual(response.data[0]['task_version'], 1)
+        response = self.write('put', url, [dict(self.task_data(), id=task['id'], task_version=0)])
+        self.assertEqual(response.status_code, 409)
+        response = self.write('put', url, [dict(self.task_data(), id=task['id'])] * 2)
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_writes_take_the_same_queries_whatever_their_size(self):
+        project = self.create_project()
+        url = reverse('task-bulk', kwargs={'pk': project.pk})
+        queries = []
+        for size in (2, 6):
+            tasks = self.write('post', url, [self.task_data()] * size).data
+            with CaptureQueriesContext(connection) as captured:
+                self.write('put', url, [dict(self.task_data(task_pct_complete=50), id=task['id']) for task in tasks])
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+
+    def test_batch_delete_is_conditional_on_versions(self):
+        project = self.create_project()
+        first, second = self.create_task(project), self.create_task(project)
+        self.update_task(second, task_pct_complete=10)
+        url = reverse('task-bulk', kwargs={'pk': project.pk})
+        response = self.write('delete', url, [first['id'], {'id': second['id'], 'task_version': 0}])
+        self.assertEqual((response.status_code, response.data['task_version']), (409, {second['id']: 1}))
+        self.assertEqual(Task.objects.count(), 2)
+
+        get_tasks = TaskBulk.get_tasks
+
+        # Another request updates the first task after the batch loaded and checked it
+        def load_then_concurrent_write(view, request, project, ids):
+            loaded = get_tasks(view, request, project, ids)
+            Task.objects.filter(pk=first['id']).update(task_version=1)
+            return loaded
+
+        with mock.patch.object(TaskBulk, 'get_tasks', load_then_concurrent_write):
+            response = self.write('delete', url, [first['id'], {'id': second['id'], 'task_version': 1}])
+        self.assertEqual((response.status_code, response.data['task_version']), (409, {first['id']: 1}))
+        self.assertEqual(Task.objects.count(), 2)
+
+        self.assertEqual(self.write('delete', url, [first['id'], second['id']]).status_code, 204)
+        self.assertEqual(Task.objects.count(), 0)
+        project.refresh_from_db()
+        self.assertEqual(project.project_no_tasks, 0)
+
+
+@override_settings(CHANGES_SETTLE_SECONDS=0)
+class ChangesFeedTests(TodoTestCase):
+
+    def test_feed_holds_only_the_projects_of_the_user(self):
+        other = self.create_user('other')
+        mine, shared, removed = [self.create_project(name) for name in ('Mine', 'Shared', 'Removed')]
+        theirs, their_removed = [self.create_project(name, user=other) for name in ('Theirs', 'Their removed')]
+        for project, user in ((mine, self.owner), (theirs, other)):
+            self.create_task(project, user=user)
+        for project in (shared, removed):
+            self.write('post', reverse('assign', kwargs={'pk': project.pk}), {'user': 'other'})
+        for project, user in ((removed, self.owner), (their_removed, other)):
+            self.write('delete', reverse('project-details', kwargs={'pk': project.pk}), user=user)
+        AssignedUser.objects.get(project=shared).delete()
+
+        data = self.read(reverse('changes')).data
+        self.assertEqual({row['id'] for row in data['projects']}, {mine.pk, shared.pk})
+        self.assertEqual({row['project'] for row in data['tasks']}, {mine.pk})
+        self.assertEqual(data['deleted']['projects'], [removed.pk])
+        self.assertEqual(len(data['deleted']['assigned_users']), 1)
+
+        # The user assigned to a project deleted, or no longer assigned, is told it is gone
+        data = self.read(reverse('changes'), user=other).data
+        self.assertEqual({row['id'] for row in data['projects']}, {theirs.pk})
+        self.assertEqual({row['project'] for row in data['tasks']}, {theirs.pk})
+        self.assertEqual(sorted(data['deleted']['projects']), [removed.pk, their_removed.pk])
+        self.assertEqual(len(data['deleted']['assigned_users']), 1)
+
+        data = self.read(reverse('changes'), user=self.create_user('admin', staff=True)).data
+        self.assertEqual(len(data['projects']), 3)
+        self.assertEqual(sorted(data['deleted']['projects']), [removed.pk, their_removed.pk])
+
+
+@override_settings(PROJECT_ROLLUP_MODE='thread')
+@mock.patch('todo_app.rollups.close_old_connections')  # would close the connection of the test transaction
+class RollupWorkerTests(TodoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.worker = rollups.RollupWorker(debounce=3600)  # applied by the tests only
+        patcher = mock.patch.object(rollups, 'worker', self.worker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assertProgress(self, project, tasks, pct_total):
+        project.refresh_from_db()
+        self.assertEqual((project.project_no_tasks, project.project_pct_total), (tasks, pct_total))
+
+    def test_delta_during_a_rebuild_is_not_counted_twice(self, close_old_connections):
+        project = self.create_project()
+        task = self.create_task(project)
+        self.worker.flush()
+        self.worker.add(project.pk, rebuild=True)
+        rebuild = self.worker.take(everything=True)
+
+        # The task write commits after the rebuild was taken and before its UPDATE reads the tasks
+        self.update_task(task, task_pct_complete=100)
+        self.worker.apply(rebuild)
+        self.assertProgress(project, 1, 100)
+        self.worker.flush()
+        self.assertProgress(project, 1, 100)
+
+    def test_delta_of_a_write_open_during_a_rebuild_is_not_counted_twice(self, close_old_connections):
+        project = self.create_project()
+        task = self.create_task(project)
+        self.worker.flush()
+
+        # The write starts before the rebuild and its delta arrives after the rebuild was applied
+        with mock.patch.object(self.worker, 'add') as add:
+            self.update_task(task, task_pct_complete=100)
+        self.worker.add(project.pk, rebuild=True)
+        self.worker.flush()
+        self.assertProgress(project, 1, 100)
+        self.worker.add(*add.call_args.args, **add.call_args.kwargs)
+        self.worker.flush()
+        self.assertProgress(project, 1, 100)
+
+        # Deltas of later writes are applied as such
+        self.update_task(task, task_pct_complete=50)
+        self.assertEqual(self.worker.take(everything=True)[project.pk]['rebuild'], False)
+
+
+class ConcurrentTaskWriteTests(TodoTransactionTestCase):
+    clients = 6
+
+    def test_concurrent_task_writes_keep_rollups_and_versions(self):
+        project = self.create_project()
+        shared = self.create_task(project)
+        own = [self.create_task(project) for n in range(self.clients)]
+        barrier = threading.Barrier(self.clients, timeout=30)
+        statuses = Counter()
+        lock = threading.Lock()
+
+        # Every client updates the shared task from version 0, its own task and adds one
+        def client_writes(n):
+            client = APIClient()
+            self.login(self.owner, client)
+            seen = Counter()
+            try:
+                barrier.wait()
+                for method, url, data in [
+                    ('put', reverse('task-details', kwargs={'pk': shared['id']}),
+                     self.task_data(task_pct_complete=n + 1, task_version=0)),
+                    ('put', reverse('task-details', kwargs={'pk': own[n]['id']}),
+                     self.task_data(task_pct_complete=100)),
+                    ('post', reverse('task-create', kwargs={'pk': project.pk}), self.task_data()),
+                ]:
+                    seen[getattr(client, method)(url, data, format='json').status_code] += 1
+            finally:
+                connections.close_all()
+                with lock:
+                    statuses.update(seen)
+
+        threads = [threading.Thread(target=client_writes, args=(n,)) for n in range(self.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses, {200: self.clients + 1, 201: self.clients, 409: self.clients - 1})
+        self.assertEqual(Task.objects.get(pk=shared['id']).task_version, 1)
+        self.assertProgressRebuilt(project)
+        self.assertEqual((project.project_no_tasks, project.project_completed_tasks), (2 * self.clients + 1,
+                                                                                       self.clients))
+
+
+class RebuildProjectProgressTests(TodoTestCase):
+
+    def test_only_drifted_projects_are_rebuilt(self):
+        drifted, intact = self.create_project('Drifted'), self.create_project('Intact')
+        for project in (drifted, intact):
+            self.update_task(self.create_task(project), task_pct_complete=100)
+        Project.objects.filter(pk=drifted.pk).update(project_no_tasks=3, project_pct_total=20)
+        versions = dict(Project.objects.values_list('pk', 'project_version'))
+
+        stdout = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_project_progress', stdout=stdout)
+        self.assertIn('Checked 2 projects, rebuilt 1.', stdout.getvalue())
+        self.assertEqual(dict(Project.objects.values_list('pk', 'project_version')),
+                         {drifted.pk: versions[drifted.pk] + 1, intact.pk: versions[intact.pk]})
+        self.assertProgressRebuilt(drifted)
+        self.assertEqual((drifted.project_no_tasks, drifted.project_completed), (1, True))
+
+    def test_task_written_during_the_rebuild_is_counted(self):
+        project = self.create_project()
+        self.create_task(project)
+        Project.objects.filter(pk=project.pk).update(project_no_tasks=5)
+
+        # A task and its delta commit after the command found the project drifted
+        def write_then_atomic():
+            Task.objects.create(project=project, task_owner=self.owner, task_name='Task', task_notes='Notes',
+                                task_pct_complete=100, task_completed=True, task_due_date=self.due_date())
+            apply_task_delta(project.pk, tasks=1, pct=100, completed=1)
+            return transaction.atomic()
+
+        with mock.patch.object(rebuild_project_progress, 'transaction', mock.Mock(atomic=write_then_atomic)):
+            call_command('rebuild_project_progress', stdout=StringIO())
+        self.assertProgressRebuilt(project)
+        self.assertEqual((project.project_no_tasks, project.project_pct_total), (2, 100))
+
+
+class SearchTests(TodoTestCase):
+
+    def search(self, query, user=None):
+        results = self.read(f'{reverse("search")}?{query}', user=user).data['results']
+        return [(row['type'], row['id']) for row in results]
+
+    def test_results_come_from_the_projects_of_the_user(self):
+        other = self.create_user('other')
+        garden = self.create_project('Garden shed', description='Timber and a roof')
+        task = self.create_task(garden, task_name='Paint the gardening tools')
+        party = self.create_project('Garden party', user=other)
+
+        self.assertEqual(sorted(self.search('q=garden')), [('project', garden.pk), ('task', task['id'])])
+        self.assertEqual(self.search('q=gard&type=tasks'), [('task', task['id'])])
+        self.assertEqual(self.search('q=garden', user=other), [('project', party.pk)])
+        self.assertEqual(self.read(f'{reverse("search")}?q=').status_code, 400)
+
+    def test_index_follows_updates_and_deletes(self):
+        project = self.create_project('Kitchen')
+        self.write('put', reverse('project-details', kwargs={'pk': project.pk}), {
+            'project_name': 'Bathroom', 'project_description': 'Tiles', 'project_due_date': self.due_date(),
+        })
+        self.assertEqual(self.search('q=kitchen'), [])
+        self.assertEqual(self.search('q=bathroom'), [('project', project.pk)])
+        self.write('delete', reverse('project-details', kwargs={'pk': project.pk}))
+        self.assertEqual(self.search('q=bathroom'), [])
+
+
+class ExportTests(TodoTestCase):
+
+    def export(self, dataset, file_format, user):
+        response = self.read(reverse('export', kwargs={'dataset': dataset, 'file_format': file_format}), user=user)
+        content = b''.join(response.streaming_content).decode() if response.streaming else None
+        return response, content
+
+    def test_exports_stream_every_row(self):
+        admin = self.create_user('admin', staff=True)
+        project = self.create_project()
+        tasks = [self.create_task(project, task_name=f'Task {n}') for n in range(3)]
+
+        response, content = self.export('projects', 'ndjson', admin)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([(row['id'], row['project_owner'], row['project_no_tasks']) for row in rows],
+                         [(project.pk, 'owner', 3)])
+
+        response, content = self.export('tasks', 'csv', admin)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="tasks.csv"')
+        rows = list(csv.DictReader(content.splitlines()))
+        self.assertEqual([(int(row['id']), int(row['project']), row['task_name']) for row in rows],
+                         [(task['id'], project.pk, task['task_name']) for task in tasks])
+
+    def test_exports_are_for_admins(self):
+        self.assertEqual(self.export('projects', 'csv', self.owner)[0].status_code, 403)
+        self.assertEqual(self.export('users', 'csv', self.create_user('admin', staff=True))[0].status_code, 404)
+
+
+class ArchiveTests(TodoTestCase):
+
+    def test_completed_projects_move_to_the_archive(self):
+        other = self.create_user('other')
+        done, open_ = self.create_project('Done'), self.create_project('Open')
+        task = self.create_task(done)
+        self.update_task(task, task_pct_complete=100)
+        self.create_task(open_)
+        Project.objects.update(project_updated_at=timezone.now() - timedelta(days=100))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('archive_projects', days=90, stdout=StringIO())
+        self.assertEqual(list(Project.objects.values_list('pk', flat=True)), [open_.pk])
+        self.assertEqual(list(ArchivedProject.objects.values_list('pk', flat=True)), [done.pk])
+        self.assertEqual(list(ArchivedTask.objects.values_list('pk', 'task_pct_complete')), [(task['id'], 100)])
+
+        self.assertEqual([row['id'] for row in self.read(reverse('archive-list')).data['results']], [done.pk])
+        details = self.read(reverse('archive-details', kwargs={'pk': done.pk})).data
+        self.assertEqual([row['id'] for row in details['tasks']], [task['id']])
+        self.assertEqual(self.read(reverse('archive-list'), user=other).data['results'], [])
+        self.assertEqual(self.read(reverse('archive-details', kwargs={'pk': done.pk}), user=other).status_code, 404)
+        self.assertEqual(self.read(reverse('project-details', kwargs={'pk': done.pk})).status_code, 404)
+
+
+class ImportTests(TodoTestCase):
+
+    def write_file(self, name, rows):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as f:
+            f.writelines(f'{json.dumps(row)}\n' for row in rows)
+        return path
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_import_rebuilds_progress_and_skips_bad_rows(self):
+        existing = self.create_project('Existing')
+        self.assertEqual(self.read(reverse('project-list')).data['count'], 1)  # cached from here on
+        projects = self.write_file('projects.jsonl', [
+            {'id': 'a', 'project_name': 'Imported', 'project_description': 'From a file',
+             'project_due_date': self.due_date()},
+            {'id': 'b', 'project_name': 'No date', 'project_description': 'Rejected'},
+        ])
+        tasks = self.write_file('tasks.jsonl', [
+            dict(self.task_data(task_pct_complete=100), project='a'),
+            dict(self.task_data(), project='a'),
+            dict(self.task_data(task_pct_complete=100), project=existing.pk),
+            dict(self.task_data(), project='b'),
+            dict(self.task_data(), project='a', task_owner='nobody'),
+        ])
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_data', projects=projects, tasks=tasks, owner='owner', existing_projects=True,
+                     stdout=stdout, stderr=stderr)
+        self.assertIn('Imported 1 projects, 3 tasks.', stdout.getvalue())
+        self.assertEqual(len(stderr.getvalue().splitlines()), 3)
+
+        imported = Project.objects.get(project_name='Imported')
+        self.assertProgressRebuilt(imported)
+        self.assertEqual((imported.project_no_tasks, imported.project_pct_complete), (2, 50))
+        rows = {row['id']: row for row in self.read(reverse('project-list')).data['results']}
+        self.assertEqual((rows[imported.pk]['project_no_tasks'], rows[existing.pk]['project_pct_complete']),
+                         (2, '100.00'))
+
+    def test_project_references_stay_in_the_file(self):
+        rejected, other = self.create_project('Rejected'), self.create_project('Other')
+        projects = self.write_file('projects.jsonl', [
+            {'id': rejected.pk, 'project_name': 'No date', 'project_description': 'Rejected'},
+        ])
+        tasks = self.write_file('tasks.jsonl', [
+            dict(self.task_data(), project=rejected.pk),
+            dict(self.task_data(), project=other.pk),
+        ])
+        for options, imported in [({}, 0), ({'existing_projects': True}, 1)]:
+            stdout = StringIO()
+            call_command('import_data', projects=projects, tasks=tasks, owner='owner', stdout=stdout,
+                         stderr=StringIO(), **options)
+            self.assertIn(f'Imported 0 projects, {imported} tasks.', stdout.getvalue())
+        self.assertEqual(list(Task.objects.values_list('project', flat=True)), [other.pk])
+
+    def test_assignments_bump_the_project_version(self):
+        project = self.create_project()
+        self.create_user('other')
+        version = Project.objects.get(pk=project.pk).project_version
+        details = self.read(reverse('project-details', kwargs={'pk': project.pk})).data  # cached from here on
+        self.assertEqual(details['assigned_users'], [])
+        assignments = self.write_file('assignments.jsonl', [{'project': project.pk, 'user': 'other'}])
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_data', assignments=assignments, existing_projects=True, stdout=StringIO())
+        self.assertEqual(Project.objects.get(pk=project.pk).project_version, version + 1)
+        details = self.read(reverse('project-details', kwargs={'pk': project.pk})).data
+        self.assertEqual(len(details['assigned_users']), 1)
+
+
+class TaskKeysetPaginationTests(TodoTestCase):
+
+    def test_pages_follow_due_date_and_id(self):
+        project = self.create_project()
+        tasks = [self.create_task(project, task_due_date=self.due_date(days)) for days in (5, 3, 5, 1, 3)]
+        url = reverse('task-list', kwargs={'pk': project.pk}) + '?page_size=2'
+        pages = []
+        while url:
+            data = self.read(url).data
+            pages.append([task['id'] for task in data['results']])
+            url = data['next']
+            if len(pages) == 1:
+                # A task added ahead of the cursor does not move the later pages
+                self.create_task(project, task_due_date=self.due_date(0))
+        ordered = [task['id'] for task in sorted(tasks, key=lambda task: (task['task_due_date'], task['id']))]
+        self.assertEqual(pages, [ordered[0:2], ordered[2:4], ordered[4:]])
+
+    def test_invalid_cursor(self):
+        project = self.create_project()
+        response = self.read(reverse('task-list', kwargs={'pk': project.pk}) + '?cursor=nonsense')
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalGetTests(TodoTestCase):
+
+    def test_unchanged_project_is_not_modified(self):
+        project = self.create_project()
+        task = self.create_task(project)
+        for name in ('project-details', 'task-list'):
+            url = reverse(name, kwargs={'pk': project.pk})
+            etag = self.read(url)['ETag']
+            response = self.read(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual((response.status_code, response['ETag']), (304, etag), name)
+            self.assertEqual(response.content, b'')
+
+            self.update_task(task, task_pct_complete=task['task_pct_complete'] + 10)
+            task = self.read(reverse('task-details', kwargs={'pk': task['id']})).data[0]
+            response = self.read(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, name)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_task_details_follow_the_version_of_their_project(self):
+        project = self.create_project()
+        task = self.create_task(project)
+        url = reverse('task-details', kwargs={'pk': task['id']})
+        etag = self.read(url)['ETag']
+        self.assertEqual(self.read(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.read(reverse('task-details', kwargs={'pk': 0}))
+        self.assertEqual((response.data, response.has_header('ETag')), ([], False))
+
+
+class AsyncReadViewTests(TodoTestCase):
+
+    def test_same_payload_and_etag_as_the_sync_views(self):
+        project = self.create_project()
+        task = self.create_task(project)
+        self.create_user('other')
+        response = self.write('post', reverse('assign', kwargs={'pk': project.pk}), {'user': 'other'})
+        self.assertEqual(response.status_code, 200)
+        for name, kwargs in [('project-list', {}), ('project-details', {'pk': project.pk}),
+                             ('task-list', {'pk': project.pk}), ('task-details', {'pk': task['id']}),
+                             ('assign', {'pk': project.pk})]:
+            sync = self.read(reverse(name, kwargs=kwargs))
+            response = self.read(reverse(f'async-{name}', kwargs=kwargs))
+            self.assertEqual((response.status_code, json.loads(response.content)), (200, sync.data), name)
+            self.assertEqual(response.get('ETag'), sync.get('ETag'), name)
+            if sync.has_header('ETag'):
+                response = self.read(reverse(f'async-{name}', kwargs=kwargs), HTTP_IF_NONE_MATCH=sync['ETag'])
+                self.assertEqual(response.status_code, 304, name)
+
+    def test_errors(self):
+        project = self.create_project()
+        url = reverse('async-project-details', kwargs={'pk': project.pk})
+        self.assertEqual(self.read(reverse('async-project-details', kwargs={'pk': 0})).status_code, 404)
+        self.assertEqual(self.client.post(url).status_code, 405)
+        self.client.credentials()
+        response = self.client.get(reverse('async-project-list'))
+        self.assertEqual((response.status_code, response['WWW-Authenticate']), (401, 'Token'))
+
+
+class ThrottlingTests(TodoTestCase):
+
+    @override_settings(THROTTLE_USER_RATES={'owner': {'user': '2/min'}})
+    def test_requests_over_the_rate_get_429(self):
+        other = self.create_user('other')
+        for name in ('project-list', 'async-project-list'):
+            throttling.store().clear()
+            url = reverse(name)
+            self.assertEqual([self.read(url).status_code for n in range(2)], [200, 200])
+            response = self.read(url)
+            self.assertEqual(response.status_code, 429, name)
+            self.assertTrue(0 < int(response['Retry-After']) <= 60)
+            self.assertEqual(self.read(url, user=other).status_code, 200)
+
+    @override_settings(THROTTLE_USER_RATES={'owner': {'user': None, 'task-update': '1/min'}})
+    def test_scoped_rate(self):
+        project = self.create_project()
+        task = self.create_task(project)
+        self.assertEqual(self.update_task(task).status_code, 200)
+        self.assertEqual(self.update_task(task).status_code, 429)
+        self.assertEqual(self.read(reverse('task-details', kwargs={'pk': task['id']})).status_code, 200)
+
+
+class SparseFieldsetTests(TodoTestCase):
+
+    def test_fields_and_expand(self):
+        project = self.create_project()
+        task = self.create_task(project)
+        url = reverse('project-details', kwargs={'pk': project.pk})
+        full = self.read(url).data  # cached, the sparse variants must not be served from it
+        self.assertEqual(full['tasks'][0]['id'], task['id'])
+        plain = set(full).difference(['tasks', 'assigned_users'])
+        for query, keys in [('?fields=id,project_name', {'id', 'project_name'}),
+                            ('?expand=tasks', plain | {'tasks'}),
+                            ('?fields=id&expand=assigned_users', {'id', 'assigned_users'})]:
+            for name in ('project-details', 'async-project-details'):
+                data = json.loads(self.read(reverse(name, kwargs={'pk': project.pk}) + query).content)
+                self.assertEqual(set(data), keys, name + query)
+        self.assertEqual(self.read(url + '?expand=tasks').data['tasks'], full['tasks'])
+
+        rows = self.read(reverse('project-list') + '?fields=id,project_pct_complete').data['results']
+        self.assertEqual(rows, [{'id': project.pk, 'project_pct_complete': '0.00'}])
+
+    def test_unknown_fields(self):
+        project = self.create_project()
+        for query in ('?fields=id,secret', '?expand=project_name'):
+            response = self.read(reverse('project-details', kwargs={'pk': project.pk}) + query)
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn('Unknown fields', response.data['error'])
+
+
+class FastSerializerTests(TodoTestCase):
+
+    def assertSamePayload(self, fast, serializer):
+        self.assertEqual(json.dumps(fast, cls=DjangoJSONEncoder), json.dumps(serializer.data, cls=DjangoJSONEncoder))
+
+    def test_same_payload_as_the_model_serializers(self):
+        other = self.create_user('other')
+        for name in ('First', 'Deuxième'):
+            project = self.create_project(name, description='Notes — with “quotes”')
+            self.update_task(self.create_task(project, task_notes='Done'), task_pct_complete=100)
+            self.update_task(self.create_task(project, task_due_date=self.due_date(3)), task_pct_complete=33)
+            response = self.write('post', reverse('assign', kwargs={'pk': project.pk}), {'user': other.username})
+            self.assertEqual(response.status_code, 200)
+        self.create_project('Empty')
+
+        projects = Project.objects.order_by('pk')
+        for fields, expand in [(None, None), (('id', 'project_name'), ()), (None, ('tasks',)),
+                               (('id',), ('tasks', 'assigned_users'))]:
+            row_serializer = fast_serializer.project_rows(fields, expand)
+            serializer = ProjectSerializer(projects, many=True, fields=fields, expand=expand)
+            self.assertSamePayload(fast_serializer.project_data(list(row_serializer.values(projects, 'id')),
+                                                                row_serializer), serializer)
+
+        tasks = Task.objects.order_by('pk')
+        for row_serializer, serializer in [(fast_serializer.task_rows(), TaskSerializer),
+                                           (fast_serializer.my_task_rows(), MyTaskSerializer),
+                                           (fast_serializer.task_detail_rows(), TaskDetailSerializer)]:
+            self.assertSamePayload([row_serializer.to_representation(row) for row in row_serializer.values(tasks)],
+                                   serializer(tasks, many=True))
+        assignments = AssignedUser.objects.order_by('pk')
+        row_serializer = fast_serializer.assigned_user_rows()
+        self.assertSamePayload([row_serializer.to_representation(row) for row in row_serializer.values(assignments)],
+                               AssignUserSerializer(assignments, many=True))
+
+
+class ORJSONTests(TodoTestCase):
+    data = {
+        'decimal': Decimal('12.50'), 'date': date(2024, 2, 29), 'time': datetime(2024, 2, 29, 8, 30, 15, 123456),
+        'aware': datetime(2024, 2, 29, 8, 30, tzinfo=dt_timezone.utc), 'id': uuid.UUID(int=1),
+        'text': 'Déjà “vu” \u2028\u2029 \U0001f600', 'numbers': {1: [1.5, None, True]}, 'nested': [{'a': []}],
+    }
+
+    def test_renderer_matches_json_renderer(self):
+        for accepted_media_type in ('application/json', 'application/json; indent=2'):
+            self.assertEqual(ORJSONRenderer().render(self.data, accepted_media_type),
+                             JSONRenderer().render(self.data, accepted_media_type), accepted_media_type)
+        with mock.patch('todo_app.renderers.orjson', None):
+            self.assertEqual(ORJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+        project = self.create_project('Déjà vu')
+        self.create_task(project)
+        response = self.read(reverse('project-details', kwargs={'pk': project.pk}))
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_parser_matches_json_parser(self):
+        body = JSONRenderer().render(self.data)
+        self.assertEqual(ORJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        latin = '{"text": "Déjà"}'.encode('latin-1')
+        self.assertEqual(ORJSONParser().parse(BytesIO(latin), parser_context={'encoding': 'latin-1'}),
+                         {'text': 'Déjà'})
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(BytesIO(b'{"text": '))
+
+        project = self.create_project()
+        response = self.write('patch', reverse('project-details', kwargs={'pk': project.pk}),
+                              {'project_description': 'Déjà “vu”'})
+        self.assertEqual(response.data['project_description'], 'Déjà “vu”')
+
+
+# The streams read rows from other threads, so the writes they see have to be committed
+class EventStreamTests(TodoTransactionTestCase):
+
+    def open(self, project_pk, stream=events.event_stream, headers=(), query_string=b''):
+        return ApplicationCommunicator(stream, {
+            'type': 'http', 'method': 'GET', 'path': f'/projects/{project_pk}/events/', 'headers': list(headers),
+            'query_string': query_string,
+        })
+
+    def authorization(self, user):
+        return [(b'authorization', f'Token {Token.objects.get_or_create(user=user)[0].key}'.encode())]
+
+    # [(event, data)] of the body chunks sent until the stream has nothing more to send for a moment
+    async def receive_events(self, communicator):
+        received = []
+        while not await communicator.receive_nothing(timeout=0.2):
+            message = await communicator.receive_output()
+            for chunk in message['body'].decode().split('\n\n'):
+                lines = dict(line.split(': ', 1) for line in chunk.splitlines() if not line.startswith(':'))
+                if lines:
+                    received.append((lines['event'], json.loads(lines['data'])))
+        return received
+
+    async def check_errors(self, project_pk):
+        for communicator, status in [
+            (self.open(project_pk), 401),
+            (self.open(project_pk, headers=[(b'authorization', b'Token nonsense')]), 401),
+            (self.open(0, headers=await sync_to_async(self.authorization)(self.owner)), 404),
+        ]:
+            await communicator.send_input({'type': 'http.request'})
+            self.assertEqual((await communicator.receive_output())['status'], status)
+            self.assertIn(b'detail', (await communicator.receive_output())['body'])
+
+    def test_auth_and_unknown_project(self):
+        async_to_sync(self.check_errors)(self.create_project().pk)
+
+    async def check_fan_out(self, project, other):
+        token = await sync_to_async(Token.objects.get)(user=self.owner)
+        streams = [self.open(project.pk, headers=await sync_to_async(self.authorization)(self.owner)),
+                   self.open(project.pk, query_string=f'token={token.key}'.encode()),
+                   self.open(other.pk, headers=await sync_to_async(self.authorization)(self.owner))]
+        for communicator in streams:
+            await communicator.send_input({'type': 'http.request'})
+            start = await communicator.receive_output()
+            self.assertEqual((start['status'], dict(start['headers'])[b'content-type']), (200, b'text/event-stream'))
+        received = [await self.receive_events(communicator) for communicator in streams]
+        self.assertEqual([stream[0][0] for stream in received], ['progress'] * 3)
+        self.assertEqual([stream[0][1]['id'] for stream in received], [project.pk, project.pk, other.pk])
+
+        task = await sync_to_async(self.create_task)(project)
+        await sync_to_async(self.write)('delete', reverse('task-details', kwargs={'pk': task['id']}))
+        received = [[(event, data['id']) for event, data in await self.receive_events(communicator)
+                     if event != 'progress'] for communicator in streams]
+        self.assertEqual(received, [[('task', task['id']), ('task_deleted', task['id'])]] * 2 + [[]])
+        self.assertEqual(events.broker.stats()['streams'], 3)
+
+        for communicator in streams:
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait(timeout=1)
+        self.assertEqual(events.broker.stats()['streams'], 0)
+
+    def test_writes_fan_out_to_the_streams_of_their_project(self):
+        async_to_sync(self.check_fan_out)(self.create_project(), self.create_project('Other'))
+
+    async def check_keepalive(self, project_pk):
+        communicator = self.open(project_pk, events.EventStream(keepalive=0.05),
+                                 headers=await sync_to_async(self.authorization)(self.owner))
+        await communicator.send_input({'type': 'http.request'})
+        await communicator.receive_output()
+        await communicator.receive_output()  # the current progress
+        self.assertEqual((await communicator.receive_output())['body'], b': keepalive\n\n')
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(timeout=1)
+
+    def test_keepalive(self):
+        async_to_sync(self.check_keepalive)(self.create_project().pk)
+
+
+class MyTasksTests(TodoTestCase):
+
+    def test_tasks_of_owned_and_assigned_projects(self):
+        other, admin = self.create_user('other'), self.create_user('admin', staff=True)
+        owned = self.create_project('Owned')
+        assigned = self.create_project('Assigned', user=other)
+        hidden = self.create_project('Hidden', user=other)
+        self.write('post', reverse('assign', kwargs={'pk': assigned.pk}), {'user': 'owner'}, user=other)
+        done = self.create_task(owned, task_due_date=self.due_date(2))
+        self.update_task(done, task_pct_complete=100, task_due_date=self.due_date(2))
+        mine = [done['id'], self.create_task(assigned, user=other, task_due_date=self.due_date(1))['id'],
+                self.create_task(owned, task_due_date=self.due_date(3))['id']]
+        self.create_task(hidden, user=other)
+
+        for fast in (True, False):
+            with self.settings(FAST_READ_SERIALIZERS=fast):
+                rows = self.read(reverse('my-tasks')).data['results']
+                self.assertEqual([(row['id'], row['project']) for row in rows],
+                                 [(mine[1], assigned.pk), (mine[0], owned.pk), (mine[2], owned.pk)])
+                rows = self.read(reverse('my-tasks') + '?task_completed=true').data['results']
+                self.assertEqual([row['id'] for row in rows], [mine[0]])
+
+        projects = [row['id'] for row in self.read(reverse('project-list')).data['results']]
+        self.assertEqual(sorted(projects), [owned.pk, assigned.pk])
+        projects = [row['id'] for row in self.read(reverse('project-list'), user=admin).data['results']]
+        self.assertEqual(sorted(projects), [owned.pk, assigned.pk, hidden.pk])
+        self.client.credentials()
+        self.assertEqual(self.client.get(reverse('my-tasks')).status_code, 401)
+
+
+# Migrates the test database back to before 0009, so it runs outside of a test transaction
+class AssignedUserMigrationTests(TransactionTestCase):
+    before = [('todo_app', '0008_change_tracking')]
+    after = [('todo_app', '0009_assigned_user_fk')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_assignments_are_linked_to_users(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model('auth', 'User')
+        Project = apps.get_model('todo_app', 'Project')
+        AssignedUser = apps.get_model('todo_app', 'AssignedUser')
+        owner = User.objects.create(username='owner')
+        other = User.objects.create(username='other')
+        project = Project.objects.create(project_owner=owner, project_name='Project', project_description='',
+                                         project_due_date=date.today())
+        for username in ('other', 'gone', 'owner', 'other'):
+            AssignedUser.objects.create(project=project, user=username)
+
+        AssignedUser = self.migrate(self.after).get_model('todo_app', 'AssignedUser')
+        self.assertEqual(list(AssignedUser.objects.order_by('pk').values_list('project', 'user')),
+                         [(project.pk, other.pk), (project.pk, owner.pk)])
+
+
+class ReadReplicaRoutingTests(TodoTestCase):
+
+    def test_router(self):
+        router = ReadReplicaRouter()
+        self.assertEqual((router.db_for_read(Project), router.db_for_write(Project)), (None, 'default'))
+        token = routing.set(RoutingState('replica1'))
+        try:
+            self.assertEqual(router.db_for_read(Project), 'replica1')
+            self.assertEqual(router.db_for_read(Task, instance=self.owner), 'default')
+            self.assertEqual(router.db_for_write(Task), 'default')
+            self.assertIsNone(router.db_for_read(Project))  # reads its own write
+        finally:
+            routing.reset(token)
+        with self.settings(READ_DATABASES=['replica1']):
+            self.assertFalse(router.allow_migrate('replica1', 'todo_app'))
+            self.assertIsNone(router.allow_migrate('default', 'todo_app'))
+
+    # The test database stands in for the replica, the reads routed to it are told apart by the router returning
+    # its alias rather than None
+    @override_settings(READ_DATABASES=['replica1'])
+    @mock.patch('todo_app.middleware.pick_replica', return_value='default')
+    def test_clients_read_their_writes_from_the_primary(self, pick_replica):
+        db_for_read = ReadReplicaRouter.db_for_read
+        routed = []
+
+        def spy(router, model, **hints):
+            routed.append(db_for_read(router, model, **hints))
+            return routed[-1]
+
+        other = self.create_user('other')
+        with mock.patch.object(ReadReplicaRouter, 'db_for_read', autospec=True, side_effect=spy):
+            def reads(user):
+                routed.clear()
+                response_cache.invalidate_lists()  # so the list is read from the database
+                self.assertEqual(self.read(reverse('project-list'), user=user).status_code, 200)
+                return set(routed)
+
+            self.assertEqual(reads(self.owner), {'default'})
+            sticky = routing_stats.snapshot().get('read_your_writes', 0)
+            self.create_project()
+            self.assertEqual(reads(self.owner), {None})
+            self.assertEqual(routing_stats.snapshot()['read_your_writes'], sticky + 1)
+            self.assertEqual(reads(other), {'default'})
+            cache.clear()  # READ_YOUR_WRITES_SECONDS have gone by
+            self.assertEqual(reads(self.owner), {'default'})
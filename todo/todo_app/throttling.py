@@ -0,0 +1,144 @@
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import throttling
+
+PRUNE_EVERY = 1000  # hits between sweeps of the keys whose window emptied
+
+
+# Exact sliding window of the request times of each key, in the memory of the process. Each key keeps at most
+# `limit` times, older ones fall out of the window as new requests come in.
+class SlidingWindowStore:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.windows = {}  # key -> (duration, deque of request times)
+        self.hits = 0
+
+    # Records a request at `now` when the window of `key` has room for it. Returns 0 when the request is
+    # allowed, else the seconds until the oldest request of the window expires.
+    def hit(self, key, limit, duration, now):
+        with self._lock:
+            history = self.windows.setdefault(key, (duration, deque()))[1]
+            while history and history[0] <= now - duration:
+                history.popleft()
+            if len(history) >= limit:
+                return history[-limit] + duration - now
+            history.append(now)
+            self.hits += 1
+            if self.hits % PRUNE_EVERY == 0:
+                self.prune(now)
+            return 0
+
+    def prune(self, now):
+        for key, (duration, history) in list(self.windows.items()):
+            if not history or history[-1] <= now - duration:
+                del self.windows[key]
+
+    def clear(self):
+        with self._lock:
+            self.windows.clear()
+
+
+# Sliding window shared by every process through a Django cache (e.g. Redis). Keeps a counter per key and
+# fixed window, and weighs the count of the previous window by how much of it still overlaps the sliding
+# window, two cache keys per client whatever its limit. The check and the increment are separate cache calls,
+# so concurrent requests may go a few over the limit.
+class CacheWindowStore:
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def hit(self, key, limit, duration, now):
+        window = int(now // duration)
+        current_key, previous_key = f'throttle:{key}:{window}', f'throttle:{key}:{window - 1}'
+        counts = self.cache.get_many([current_key, previous_key])
+        current, previous = counts.get(current_key, 0), counts.get(previous_key, 0)
+        elapsed = now / duration - window  # part of the current window gone by
+        if current >= limit:
+            # Full until the window ends, and then until the weight of this window leaves room
+            return (1 - elapsed + 1 - limit / current) * duration
+        if previous * (1 - elapsed) + current >= limit:
+            # The weight of the previous window drops until it leaves room for one more request
+            return ((1 - (limit - current) / previous) - elapsed) * duration
+        if not self.cache.add(current_key, 1, timeout=duration * 2):
+            self.cache.incr(current_key)
+        return 0
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+# Store of the request windows, set by THROTTLE_CACHE: None keeps them in the process, a cache alias shares
+# them between processes
+def store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                alias = getattr(settings, 'THROTTLE_CACHE', None)
+                _store = SlidingWindowStore() if alias is None else CacheWindowStore(alias)
+    return _store
+
+
+# DRF throttle counting requests in a sliding window instead of DRF's history list in the cache. Rates come
+# from DEFAULT_THROTTLE_RATES by scope, THROTTLE_USER_RATES overrides them for single users (None lifts the
+# limit). Throttled requests get 429 with a Retry-After header.
+class SlidingWindowThrottle(throttling.SimpleRateThrottle):
+
+    def allow_request(self, request, view):
+        if not getattr(settings, 'THROTTLE_ENABLED', True):
+            return True
+        rate = self.user_rate(request)
+        if rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        limit, duration = self.parse_rate(rate)
+        self.wait_seconds = store().hit(self.key, limit, duration, self.timer())
+        return self.wait_seconds == 0
+
+    def user_rate(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            user_rates = getattr(settings, 'THROTTLE_USER_RATES', {}).get(user.get_username(), {})
+            if self.scope in user_rates:
+                return user_rates[self.scope]
+        return self.rate
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class AnonRateThrottle(SlidingWindowThrottle, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(SlidingWindowThrottle, throttling.UserRateThrottle):
+    pass
+
+
+# Budget of its own for the views with a `throttle_scope`, per user (per address for anonymous requests). A
+# dict of method -> scope throttles only those methods of the view.
+class ScopedRateThrottle(SlidingWindowThrottle, throttling.ScopedRateThrottle):
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if isinstance(self.scope, dict):
+            self.scope = self.scope.get(request.method)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        return super().allow_request(request, view)
+
+
+# Registration hashes a password per request, limited per address whether the client is logged in or not
+class RegistrationRateThrottle(SlidingWindowThrottle):
+    scope = 'register'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
@@ -1,10 +1,14 @@
 from django.urls import path
-from todo_app.views import TaskList, TaskDetail, ProjectList, ProjectDetail, TaskCreate, Assign
+from todo_app.views import TaskList, TaskDetail, ProjectList, ProjectDetail, TaskCreate, Assign, TaskBulk, \
+    Stats, Export, Changes, MyTasks, ArchivedProjectList, ArchivedProjectDetail, Search
+from todo_app.async_views import AsyncProjectList, AsyncProjectDetail, AsyncTaskList, AsyncTaskDetail, AsyncAssignList
 
 urlpatterns = [
     # path('task/list/', TaskList.as_view(), name='task-list'),
 
     path('list/', ProjectList.as_view(), name='project-list'),
+    path('mine/', MyTasks.as_view(), name='my-tasks'),
+    path('search/', Search.as_view(), name='search'),
     path('<int:pk>/', ProjectDetail.as_view(), name='project-details'),
     path('<int:pk>/assign/', Assign.as_view(), name='assign'),
     # path('<int:pk>/de-assign/', RemoveAssigned.as_view(), name='de-assign'),
@@ -12,5 +16,22 @@ urlpatterns = [
     path('task/<int:pk>/', TaskDetail.as_view(), name='task-details'),
     path('<int:pk>/task-create/', TaskCreate.as_view(), name='task-create'),
     path('<int:pk>/tasks/', TaskList.as_view(), name='task-list'),
+    path('<int:pk>/tasks/bulk/', TaskBulk.as_view(), name='task-bulk'),
+
+    path('changes/', Changes.as_view(), name='changes'),
+
+    # Read-only archive of completed projects, see `manage.py archive_projects`
+    path('archive/', ArchivedProjectList.as_view(), name='archive-list'),
+    path('archive/<int:pk>/', ArchivedProjectDetail.as_view(), name='archive-details'),
+
+    # Native async versions of the read endpoints above, GET only
+    path('async/list/', AsyncProjectList.as_view(), name='async-project-list'),
+    path('async/<int:pk>/', AsyncProjectDetail.as_view(), name='async-project-details'),
+    path('async/<int:pk>/assign/', AsyncAssignList.as_view(), name='async-assign'),
+    path('async/task/<int:pk>/', AsyncTaskDetail.as_view(), name='async-task-details'),
+    path('async/<int:pk>/tasks/', AsyncTaskList.as_view(), name='async-task-list'),
+
+    path('export/<str:dataset>/<str:file_format>/', Export.as_view(), name='export'),
+    path('stats/', Stats.as_view(), name='stats'),
 
 ]
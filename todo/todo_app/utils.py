@@ -1,34 +1,98 @@
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
+from django.utils import timezone
+
+from todo_app.cache import response_cache
 from todo_app.models import Project, Task
 
 
+PROGRESS_FIELDS = [
+    'project_no_tasks',
+    'project_pct_total',
+    'project_completed_tasks',
+    'project_pct_complete',
+    'project_completed',
+]
+
+
+# UPDATE assignments of percent complete and the completed flag worked out in the database from expressions
+# for the task count and percent total. Percent complete is rounded half up to hundredths with integer
+# division.
+def progress_assignments(no_tasks, pct_total):
+    has_tasks = GreaterThan(no_tasks, 0)
+    hundredths = (pct_total * 200 + no_tasks) / (no_tasks * 2)
+    return {
+        'project_pct_complete': Case(When(has_tasks, then=hundredths / Value(100.0)), default=Value(0),
+                                     output_field=DecimalField()),
+        'project_completed': Case(When(has_tasks & GreaterThanOrEqual(pct_total * 200 + no_tasks, no_tasks * 20000),
+                                       then=Value(True)), default=Value(False)),
+    }
+
+
+# Contribution of a single task to the project aggregates
+def task_progress(task):
+    return task.task_pct_complete, int(task.task_completed)
+
+
+# Adjust the project aggregates by the change caused by one task write with a single UPDATE computed by the
+# database, so concurrent writes neither lose increments nor lock the row for longer than the statement.
+# The expressions of SET see the row as it was before the UPDATE, so percent complete is worked out from the
+# old values plus the deltas.
+def apply_task_delta(project_pk, tasks=0, pct=0, completed=0):
+    no_tasks = F('project_no_tasks') + tasks
+    pct_total = F('project_pct_total') + pct
+    Project.objects.filter(pk=project_pk).update(
+        project_no_tasks=no_tasks,
+        project_pct_total=pct_total,
+        project_completed_tasks=F('project_completed_tasks') + completed,
+        project_version=F('project_version') + 1,
+        project_updated_at=timezone.now(),
+        **progress_assignments(no_tasks, pct_total),
+    )
+    invalidate_project_cache(project_pk)
+
+
+# UPDATE assignments of the aggregates worked out from the task table of each project by correlated
+# subqueries, with percent complete and the completed flag
+def rebuilt_progress():
+    tasks = Task.objects.filter(project=OuterRef('pk')).order_by().values('project')
+
+    def total(aggregate):
+        return Coalesce(Subquery(tasks.annotate(total=aggregate).values('total')), 0)
+
+    no_tasks = total(Count('id'))
+    pct_total = total(Sum('task_pct_complete'))
+    return {
+        'project_no_tasks': no_tasks,
+        'project_pct_total': pct_total,
+        'project_completed_tasks': total(Count('id', filter=Q(task_completed=True))),
+        **progress_assignments(no_tasks, pct_total),
+    }
+
+
+# Rebuild the aggregates from the task table, used after batch writes and to repair projects whose
+# aggregates have drifted. The totals are subqueries of the UPDATE so tasks written concurrently are not
+# missed between reading the totals and writing them.
 def update_project_fields(project_pk):
-    project = Project.objects.get(pk=project_pk)
-
-    # Check if number of tasks in a project
-    if project.project_no_tasks <= 0:
-        project.project_pct_complete = 0
-        project.save()
-        return
-
-    # Loop through tasks to determine total percent complete and calculate average
-    project_pct_complete = 0
-    for task in Task.objects.filter(project=project_pk):
-        project_pct_complete = project_pct_complete + task.task_pct_complete
-    project.project_pct_complete = project_pct_complete / project.project_no_tasks
-
-    # set project completed flag
-    if project.project_pct_complete == 100:
-        project.project_completed = True
-    else:
-        project.project_completed = False
-    project.save()
-    return
-
-# Set task completed flag
-def update_task_fields(task):
-    if task.task_pct_complete == 100:
-        task.task_completed = True
-    else:
-        task.task_completed = False
-    task.save()
+    Project.objects.filter(pk=project_pk).update(
+        project_version=F('project_version') + 1,
+        project_updated_at=timezone.now(),
+        **rebuilt_progress(),
+    )
+    invalidate_project_cache(project_pk)
+
+
+# Mark a project as changed for writes that do not go through the progress updates above
+def bump_project_version(project_pk):
+    Project.objects.filter(pk=project_pk).update(project_version=F('project_version') + 1,
+                                                 project_updated_at=timezone.now())
+    invalidate_project_cache(project_pk)
+
 
+# Drop the cached responses of a project once the write commits, so no request rebuilds them from the rows
+# before it. Writes through update() and bulk_update() send no post_save, the receivers in todo_app.signals
+# do not see them.
+def invalidate_project_cache(project_pk):
+    transaction.on_commit(lambda: response_cache.invalidate_project(project_pk))
@@ -1,19 +1,174 @@
+import logging
+from collections import defaultdict
 from datetime import datetime
+from functools import reduce
+from operator import or_
 
 from rest_framework import generics
 from rest_framework.exceptions import ValidationError
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, IsAdminUser
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-
-from todo_app.models import Project, Task, AssignedUser
-from todo_app.serializer import TaskSerializer, ProjectSerializer, AssignUserSerializer, TaskDetailSerializer
-from todo_app.utils import update_project_fields, update_task_fields
+from django.db import IntegrityError, transaction
+from django.db.models import F, Prefetch, Q
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from todo_app.models import Project, Task, AssignedUser, ArchivedProject, ArchivedTask, ArchivedAssignedUser
+from todo_app.serializer import TaskSerializer, ProjectSerializer, AssignUserSerializer, TaskDetailSerializer, \
+    MyTaskSerializer, ArchivedProjectSerializer, ArchivedProjectDetailSerializer
+from todo_app.utils import task_progress, bump_project_version, invalidate_project_cache
+from todo_app import rollups, events
+from todo_app.conditional import ProjectVersionETagMixin, task_project_version
+from todo_app.cache import response_cache
+from todo_app.export import DATASETS, ndjson_lines, csv_lines
+from todo_app.changes import changes_since, decode_cursor
+from todo_app.middleware import view_stats
+from todo_app.routers import routing_stats
+from todo_app import fast_serializer
+from user_app.authentication import token_cache
 from todo_app.permissions import IsAdminOrReadOnly, IsOwnerOrReadOnly, IsProjectOwner, IsAssignedToProject
+from todo_app.loaders import get_project, get_task
+from todo_app.pagination import ProjectPagination, TaskKeysetPagination, SearchPagination
+from todo_app import search
 
+from django.conf import settings
 from django.contrib.auth.models import User
 
+logger = logging.getLogger(__name__)
+
+
+# Projects a user owns or is assigned to, every project for admins. Each side of the OR is answered by an
+# index: project_owner on Project, (user, project) on AssignedUser.
+def user_projects(user):
+    if user.is_staff:
+        return Project.objects.all()
+    return Project.objects.filter(
+        Q(project_owner=user) | Q(pk__in=AssignedUser.objects.filter(user=user).values('project')))
+
+
+# Project list entries are shared by the users who see the same projects
+def project_list_scope(user):
+    return 'all' if user.is_staff else f'user:{user.pk}'
+
+
+# Projects with owners, tasks (and their owners) and assigned users loaded in a fixed number of queries. With
+# a sparse fieldset only the requested columns are selected and relations that are not expanded are not
+# queried at all.
+def project_queryset(fields=None, expand=None, projects=None):
+    if fields is None and expand is None:
+        expand = ProjectSerializer.expandable_fields
+
+    projects = (Project.objects if projects is None else projects).order_by('pk')
+    if fields is None or 'project_owner' in fields:
+        projects = projects.select_related('project_owner')
+    if fields is not None:
+        columns = [name for name in fields if name not in ProjectSerializer.expandable_fields]
+        if 'project_owner' in columns:
+            columns.append('project_owner__username')
+        projects = projects.only(*columns)
+
+    if 'tasks' in expand:
+        projects = projects.prefetch_related(
+            Prefetch('tasks', queryset=Task.objects.select_related('task_owner').order_by('pk')))
+    if 'assigned_users' in expand:
+        projects = projects.prefetch_related(
+            Prefetch('assigned_users', queryset=AssignedUser.objects.select_related('user').order_by('pk')))
+    return projects
+
+
+# ?fields=a,b and ?expand=tasks,assigned_users of the project endpoints as (fields, expand). (None, None) when
+# neither is given, which keeps the full payload.
+def sparse_fieldset(request):
+    params = request.query_params
+    if 'fields' not in params and 'expand' not in params:
+        return None, None
+    fields = [name for name in params['fields'].split(',') if name] if 'fields' in params else None
+    expand = [name for name in params.get('expand', '').split(',') if name]
+
+    unknown = [name for name in expand if name not in ProjectSerializer.expandable_fields]
+    if fields is not None:
+        known = ProjectSerializer().fields
+        unknown += [name for name in fields if name not in known]
+    if unknown:
+        raise ValidationError({'error': f'Unknown fields: {", ".join(unknown)}'})
+    return fields, expand
+
+
+# Tasks of a project for the task list, with the optional filters of the query string. Each filter is
+# backed by a composite index on Task.
+def task_queryset(project_pk, params):
+    return filter_tasks(Task.objects.filter(project=project_pk), params)
+
+
+# Tasks of every project the user owns or is assigned to, one query using the same indexes as the task list
+def my_task_queryset(user, params):
+    return filter_tasks(Task.objects.filter(project__in=user_projects(user).values('pk')), params)
+
+
+def filter_tasks(tasks, params):
+    tasks = tasks.select_related('task_owner')
+    if 'task_completed' in params:
+        tasks = tasks.filter(task_completed=params['task_completed'].lower() in ('true', '1'))
+    if 'task_owner' in params:
+        tasks = tasks.filter(task_owner__username=params['task_owner'])
+    if 'due_after' in params:
+        tasks = tasks.filter(task_due_date__gte=date_param(params, 'due_after'))
+    if 'due_before' in params:
+        tasks = tasks.filter(task_due_date__lte=date_param(params, 'due_before'))
+    return tasks
+
+
+def date_param(params, name):
+    try:
+        return datetime.strptime(params[name], '%Y-%m-%d').date()
+    except ValueError:
+        raise ValidationError({'error': f'{name} must be a date in the format YYYY-MM-DD'})
+
+
+# Rules a task must meet when it is added to a project, returns the error message of the first rule broken
+def new_task_error(project, task_data):
+    task_due_date = task_data['task_due_date']
+    if task_due_date > project.project_due_date or task_due_date < datetime.now().date():
+        return 'The Task due date cannot be before today or later than the project due date'
+    elif task_data['task_pct_complete'] != 0:
+        return 'Initial Task Complete percentage must be zero'
+    return None
+
+
+# Version of the task the client based its write on: task_version of the request data when given, otherwise
+# the version loaded by this request
+def expected_task_version(data, task):
+    try:
+        return int(data.get('task_version', task.task_version))
+    except (AttributeError, TypeError, ValueError):
+        raise ValidationError({'task_version': 'A valid integer is required.'})
+
+
+def task_conflict(task_pks):
+    versions = dict(Task.objects.filter(pk__in=task_pks).values_list('pk', 'task_version'))
+    return Response({'error': 'The task was changed by another request, reload it and try again',
+                     'task_version': versions}, status=status.HTTP_409_CONFLICT)
+
+
+# Claim the tasks of a batch with one UPDATE bumping the version of each task still at the version it was
+# checked against (task pk -> version). False when another request changed one of them meanwhile, the caller
+# rolls the transaction back.
+def claim_tasks(versions):
+    by_version = defaultdict(list)
+    for task_pk, version in versions.items():
+        by_version[version].append(task_pk)
+    matched = reduce(or_, (Q(task_version=version, pk__in=pks) for version, pks in by_version.items()))
+    return Task.objects.filter(matched).update(task_version=F('task_version') + 1) == len(versions)
+
+
+# Tasks of a batch that are no longer at the version the batch was checked against, once it was rolled back
+def stale_tasks(versions):
+    current = dict(Task.objects.filter(pk__in=versions).values_list('pk', 'task_version'))
+    return [task_pk for task_pk, version in versions.items() if current.get(task_pk) != version]
+
 
 class TaskCreate(generics.CreateAPIView):
     serializer_class = TaskSerializer
@@ -24,32 +179,42 @@ class TaskCreate(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         project_pk = self.kwargs.get('pk')  # get pk of project passed from url.
-        project = Project.objects.get(pk=project_pk)  # set project variable as called project object
-
-        task_due_date = datetime.strptime((self.request.data['task_due_date']), '%Y-%m-%d').date()
+        project = get_project(self.request, project_pk)  # set project variable as called project object
 
-        if task_due_date > project.project_due_date or task_due_date < datetime.now().date():
-            raise ValidationError(
-                {'error': 'The Task due date cannot be before today or later than the project due date'}
-                                    )
-        elif serializer.validated_data['task_pct_complete'] != 0:
-            raise ValidationError({'error': 'Initial Task Complete percentage must be zero'})
+        error = new_task_error(project, serializer.validated_data)
+        if error:
+            raise ValidationError({'error': error})
 
         # When overriding create method modified model fields (objects) not in request have to be sent in
         # serializer.save()
-        task = serializer.save(project=project, task_owner=self.request.user)
-        project.project_no_tasks = project.project_no_tasks + 1
-        project.save()
-        update_project_fields(task.project.pk)
+        with transaction.atomic():
+            task = serializer.save(project=project, task_owner=self.request.user)
+            events.tasks_changed(project.pk, [task.pk])
+            rollups.task_changed(project.pk, tasks=1, pct=task.task_pct_complete)
 
 
 class ProjectList(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'project-list'
 
     def get(self, request):
-        project = Project.objects.all()
-        serializer = ProjectSerializer(project, many=True, context={'request': request})
-        return Response(serializer.data)
+        return Response(response_cache.get_project_list(request.build_absolute_uri(), lambda: self.list_page(request),
+                                                        scope=project_list_scope(request.user)))
+
+    def list_page(self, request):
+        fields, expand = sparse_fieldset(request)
+        paginator = ProjectPagination()
+        if settings.FAST_READ_SERIALIZERS:
+            row_serializer = fast_serializer.project_rows(*[None if names is None else tuple(names)
+                                                            for names in (fields, expand)])
+            rows = row_serializer.values(user_projects(request.user).order_by('pk'), 'id')
+            page = paginator.paginate_queryset(rows, request, view=self)
+            return paginator.get_paginated_response(fast_serializer.project_data(page, row_serializer)).data
+
+        projects = project_queryset(fields, expand, projects=user_projects(request.user))
+        page = paginator.paginate_queryset(projects, request, view=self)
+        serializer = ProjectSerializer(page, many=True, fields=fields, expand=expand, context={'request': request})
+        return paginator.get_paginated_response(serializer.data).data
 
     def post(self, request):
         serializer = ProjectSerializer(data=request.data)
@@ -60,11 +225,52 @@ class ProjectList(APIView):
             return Response(serializer.errors)
 
 
-class ProjectDetail(generics.RetrieveUpdateDestroyAPIView):
+class ProjectDetail(ProjectVersionETagMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsProjectOwner]
-    queryset = Project.objects.all()
     serializer_class = ProjectSerializer
 
+    def get_queryset(self):
+        return project_queryset()
+
+    def get_project_version(self, request, *args, **kwargs):
+        self.version = super().get_project_version(request, *args, **kwargs)
+        return self.version
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.version is None:
+            raise Http404
+        fields, expand = sparse_fieldset(request)
+
+        def build():
+            project = get_object_or_404(project_queryset(fields, expand), pk=self.kwargs['pk'])
+            return ProjectSerializer(project, fields=fields, expand=expand,
+                                     context=self.get_serializer_context()).data
+
+        data = response_cache.get_project(*self.version, build, variant=f'{fields}|{expand}')
+        return Response(data)
+
+    # Writes change the project loaded by the permission check, without the relations of the payload
+    def get_object(self):
+        project = get_project(self.request, self.kwargs['pk'])
+        self.check_object_permissions(self.request, project)
+        return project
+
+    # The payload of the updated project is built once, from the queryset prefetching its relations
+    def update(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.get_object(), data=request.data, partial=kwargs.pop('partial', False))
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(self.get_serializer(project_queryset().get(pk=serializer.instance.pk)).data)
+
+    # Only the fields of the request are written. The progress fields of the project loaded at the start of the
+    # request may be behind task deltas applied since, writing them back would undo those.
+    def perform_update(self, serializer):
+        project = serializer.instance
+        for field, value in serializer.validated_data.items():
+            setattr(project, field, value)
+        project.project_version = F('project_version') + 1
+        project.save(update_fields=[*serializer.validated_data, 'project_version', 'project_updated_at'])
+
 
 # class AssignUser(generics.ListCreateAPIView):
 #     serializer_class = AssignUserSerializer
@@ -94,48 +300,74 @@ class Assign(APIView):
         serializer = AssignUserSerializer(data=request.data)
 
         project_pk = self.kwargs.get('pk')
-        project = Project.objects.get(pk=project_pk)
+        project = get_project(request, project_pk)
         new_user = self.request.data['user']
 
         if serializer.is_valid():
             # User Validation below  must be in view due custom user field in AssignUserSerializer
-            if not (User.objects.filter(username=new_user).exists()):
+            user = User.objects.filter(username=new_user).first()
+            if user is None:
                 return Response({"error": f"The username {new_user} does not exist"}, status=status.HTTP_404_NOT_FOUND)
-            elif AssignedUser.objects.filter(project=project_pk, user=new_user).exists():
+            try:
+                # The unique (project, user) constraint refuses a second assignment, even one made concurrently
+                with transaction.atomic():
+                    serializer.save(project=project, user=user)
+            except IntegrityError:
                 return Response({"error": f"{new_user} is already assigned to the {project.project_name} project"},
                                 status=status.HTTP_400_BAD_REQUEST
                                 )
-            serializer.save(project=project, user=new_user)
+            bump_project_version(project.pk)
             return Response(serializer.data)
 
     def get(self, request, pk):
-        print(pk)
-        project = AssignedUser.objects.filter(project=pk)
-        print(project)
+        project = AssignedUser.objects.filter(project=pk).select_related('user')
         serializer = AssignUserSerializer(project, many=True)
         return Response(serializer.data)
 
     def delete(self, request,pk):
         # project_pk = self.kwargs['pk']
-        print(pk)
-        print(self.request.data['user'])
-        user_remove = AssignedUser.objects.filter(project=pk, user=self.request.data['user'])
-        print(user_remove)
+        logger.debug('remove assigned user: project=%s user=%s', pk, self.request.data['user'])
+        user_remove = AssignedUser.objects.filter(project=pk, user__username=self.request.data['user'])
         if user_remove.exists():
             user_remove.delete()
+            bump_project_version(pk)
             return Response(status=status.HTTP_204_NO_CONTENT)
         else:
             return Response({"error": "User is not assigned to this project"})
 
 
-class TaskList(generics.ListAPIView):
+class TaskList(ProjectVersionETagMixin, generics.ListAPIView):
     # queryset = Task.objects.all()
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = TaskKeysetPagination
+
+    def get_queryset(self):
+        return task_queryset(self.kwargs['pk'], self.request.query_params)  # project pk passed from url
+
+    def list(self, request, *args, **kwargs):
+        if not settings.FAST_READ_SERIALIZERS:
+            return super().list(request, *args, **kwargs)
+        row_serializer = fast_serializer.task_rows()
+        page = self.paginate_queryset(row_serializer.values(self.get_queryset(), 'task_due_date', 'id'))
+        return self.get_paginated_response([row_serializer.to_representation(row) for row in page])
+
+
+# Tasks of every project the user owns or is assigned to, with the filters and keyset pages of the task list
+class MyTasks(generics.ListAPIView):
+    serializer_class = MyTaskSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = TaskKeysetPagination
 
     def get_queryset(self):
-        pk = self.kwargs['pk']  # project pk passed from url
-        return Task.objects.filter(project=pk)  # use the selected project as filter for list of tasks
+        return my_task_queryset(self.request.user, self.request.query_params)
+
+    def list(self, request, *args, **kwargs):
+        if not settings.FAST_READ_SERIALIZERS:
+            return super().list(request, *args, **kwargs)
+        row_serializer = fast_serializer.my_task_rows()
+        page = self.paginate_queryset(row_serializer.values(self.get_queryset(), 'task_due_date', 'id'))
+        return self.get_paginated_response([row_serializer.to_representation(row) for row in page])
 
 
 # class TaskDetail(generics.RetrieveUpdateDestroyAPIView):
@@ -161,33 +393,273 @@ class TaskList(generics.ListAPIView):
 #         update_task_fields(task)
 
 
-class TaskDetail(APIView):
+class TaskDetail(ProjectVersionETagMixin, APIView):
     permission_classes = [IsOwnerOrReadOnly]
+    throttle_scope = {'PUT': 'task-update'}
+    version_lookup = staticmethod(task_project_version)
 
     def get(self, request, pk):
-        task = Task.objects.filter(pk=pk)
+        task = Task.objects.filter(pk=pk).select_related('project', 'task_owner')
         serializer = TaskDetailSerializer(task, many=True)
         return Response(serializer.data)
 
+    # Writes are conditional on the task version, so the task a delta is worked out from is the task that is
+    # changed. A write that lost the race to another one is answered with 409 instead of being applied.
     def delete(self, request, pk):
-        task = Task.objects.get(pk=pk)
-        print(task.project)
-        task.project.project_no_tasks = task.project.project_no_tasks - 1
-        task.project.save()
-        task.delete()
-        update_project_fields(task.project.pk)
+        task = get_task(request, pk)
+        logger.debug('delete task: task=%s project=%s', task.pk, task.project_id)
+        version = expected_task_version(request.data, task)
+        pct, completed = task_progress(task)
+        with transaction.atomic():
+            # Claim the task with a conditional UPDATE first, deleting it goes through the delete collector
+            if not Task.objects.filter(pk=task.pk, task_version=version).update(task_version=F('task_version') + 1):
+                return task_conflict([task.pk])
+            events.tasks_deleted(task.project_id, [task.pk])
+            task.delete()
+            rollups.task_changed(task.project_id, tasks=-1, pct=-pct, completed=-completed)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     def put(self, request, pk):
-        task = Task.objects.get(pk=pk)
+        task = get_task(request, pk)
         self.check_object_permissions(self.request, task)
+        version = expected_task_version(request.data, task)
+        if version != task.task_version:
+            return task_conflict([task.pk])
+        old_pct, old_completed = task_progress(task)
         serializer = TaskSerializer(task, data=request.data)
-        if serializer.is_valid():
-            serializer.save(project=task.project, task_owner=task.task_owner)
-        update_project_fields(task.project.pk)
-        update_task_fields(task)
-        return Response(serializer.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        changes = dict(serializer.validated_data)
+        changes['task_completed'] = changes['task_pct_complete'] == 100
+        # auto_now is not applied by update()
+        changes['task_last_update'] = datetime.now().date()
+        changes['task_updated_at'] = timezone.now()
+        with transaction.atomic():
+            if not Task.objects.filter(pk=task.pk, task_version=version).update(
+                    task_version=F('task_version') + 1, **changes):
+                return task_conflict([task.pk])
+            for field, value in changes.items():
+                setattr(task, field, value)
+            task.task_version = version + 1
+            pct, completed = task_progress(task)
+            invalidate_project_cache(task.project_id)  # the payloads embed the task
+            events.tasks_changed(task.project_id, [task.pk])
+            rollups.task_changed(task.project_id, pct=pct - old_pct, completed=completed - old_completed)
+        return Response(TaskSerializer(task).data)
+
+
+# Batch create, update and delete of the tasks of a project. The whole batch is validated before anything
+# is written, written in one transaction and the project progress is recomputed once per batch.
+class TaskBulk(APIView):
+    permission_classes = [IsAssignedToProject]
+    update_fields = ['task_name', 'task_notes', 'task_pct_complete', 'task_due_date', 'task_completed',
+                     'task_last_update', 'task_updated_at']
+
+    def get_batch(self, request):
+        batch = request.data
+        if not isinstance(batch, list) or not batch:
+            raise ValidationError({'error': 'Request body must be a non-empty list'})
+        if len(batch) > settings.TASK_BATCH_MAX_SIZE:
+            raise ValidationError({'error': f'A batch cannot hold more than {settings.TASK_BATCH_MAX_SIZE} items'})
+        return batch
+
+    # Load the tasks of the batch in one query and check the user may change every one of them
+    def get_tasks(self, request, project, ids):
+        tasks = Task.objects.select_related('task_owner').in_bulk(ids)
+        missing = [pk for pk in ids if pk not in tasks or tasks[pk].project_id != project.pk]
+        if missing:
+            raise ValidationError({'error': f'Tasks {missing} do not exist in the {project.project_name} project'})
+        if not (request.user.is_staff or request.user == project.project_owner):
+            denied = [pk for pk, task in tasks.items() if task.task_owner_id != request.user.pk]
+            if denied:
+                return None, Response({'error': f'Permission denied for tasks {denied}. You must be the task owner, '
+                                                f'project owner or an admin.'}, status=status.HTTP_403_FORBIDDEN)
+        return tasks, None
+
+    def post(self, request, pk):
+        project = get_project(request, pk)
+        serializer = TaskSerializer(data=self.get_batch(request), many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        errors = [new_task_error(project, task_data) for task_data in serializer.validated_data]
+        if any(errors):
+            return Response([{'error': error} if error else {} for error in errors], status=status.HTTP_400_BAD_REQUEST)
+
+        tasks = [Task(project=project, task_owner=request.user, **task_data) for task_data in serializer.validated_data]
+        with transaction.atomic():
+            tasks = Task.objects.bulk_create(tasks)
+            invalidate_project_cache(project.pk)
+            events.tasks_changed(project.pk, [task.pk for task in tasks])
+            rollups.project_changed(project.pk)
+        return Response(TaskSerializer(tasks, many=True).data, status=status.HTTP_201_CREATED)
+
+    def put(self, request, pk):
+        project = get_project(request, pk)
+        batch = self.get_batch(request)
+        try:
+            ids = [int(item['id']) for item in batch]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError({'error': 'Every item of the batch must have the id of the task to update'})
+        if len(set(ids)) != len(ids):
+            raise ValidationError({'error': 'A task can only be updated once per batch'})
+        tasks, denied = self.get_tasks(request, project, ids)
+        if denied:
+            return denied
+        # Items giving a task_version must match the version of the task, as for single updates
+        versions = {task_pk: expected_task_version(item, tasks[task_pk]) for task_pk, item in zip(ids, batch)}
+        stale = [task_pk for task_pk, version in versions.items() if version != tasks[task_pk].task_version]
+        if stale:
+            return task_conflict(stale)
+
+        serializers = [TaskSerializer(tasks[task_pk], data=item) for task_pk, item in zip(ids, batch)]
+        valid = [serializer.is_valid() for serializer in serializers]
+        if not all(valid):
+            return Response([serializer.errors for serializer in serializers], status=status.HTTP_400_BAD_REQUEST)
+
+        today = datetime.now().date()
+        now = timezone.now()
+        for serializer in serializers:
+            task = serializer.instance
+            for field, value in serializer.validated_data.items():
+                setattr(task, field, value)
+            task.task_completed = task.task_pct_complete == 100
+            task.task_last_update = today  # auto_now is not applied by bulk_update
+            task.task_updated_at = now
+            task.task_version = task.task_version + 1
+        with transaction.atomic():
+            # A batch racing another write to one of its tasks changes nothing
+            claimed = claim_tasks(versions)
+            if claimed:
+                Task.objects.bulk_update([serializer.instance for serializer in serializers], self.update_fields)
+                invalidate_project_cache(project.pk)
+                events.tasks_changed(project.pk, ids)
+                rollups.project_changed(project.pk)
+            else:
+                transaction.set_rollback(True)
+        if not claimed:
+            return task_conflict(stale_tasks(versions))
+        return Response([serializer.data for serializer in serializers])
+
+    # Items are task ids, or {"id": ..., "task_version": ...} to delete a task only at the version read
+    def delete(self, request, pk):
+        project = get_project(request, pk)
+        batch = self.get_batch(request)
+        try:
+            ids = [int(item['id'] if isinstance(item, dict) else item) for item in batch]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError({'error': 'Request body must be a list of task ids'})
+        tasks, denied = self.get_tasks(request, project, ids)
+        if denied:
+            return denied
+        versions = {task_pk: expected_task_version(item if isinstance(item, dict) else {}, tasks[task_pk])
+                    for task_pk, item in zip(ids, batch)}
+        stale = [task_pk for task_pk, version in versions.items() if version != tasks[task_pk].task_version]
+        if stale:
+            return task_conflict(stale)
+
+        with transaction.atomic():
+            # Claimed first like single deletes, deleting the tasks goes through the delete collector
+            claimed = claim_tasks(versions)
+            if claimed:
+                Task.objects.filter(pk__in=tasks.keys()).delete()
+                events.tasks_deleted(project.pk, list(tasks.keys()))
+                rollups.project_changed(project.pk)
+            else:
+                transaction.set_rollback(True)
+        if not claimed:
+            return task_conflict(stale_tasks(versions))
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+# Projects, tasks and assigned users changed since the ?since= cursor of the previous page, and the ids of
+# those deleted. Start without a cursor and poll with the `next` cursor of the last response.
+class Changes(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        since = decode_cursor(request.query_params.get('since'))
+        projects = None if request.user.is_staff else user_projects(request.user)
+        return Response(changes_since(since, settings.CHANGES_PAGE_SIZE, projects, request.user))
+
+
+# Projects and tasks matching the words of ?q=, best match first, from the projects the user can see.
+# ?type=projects or ?type=tasks limits the results to one of them.
+class Search(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        names = request.query_params.get('type')
+        names = list(search.INDEXES) if names is None else names.split(',')
+        if not names or set(names).difference(search.INDEXES):
+            raise ValidationError({'type': f'Give one of {", ".join(search.INDEXES)}'})
+        projects = None if request.user.is_staff else user_projects(request.user)
+        paginator = SearchPagination()
+        limit, offset = paginator.get_limits(request)
+        results = search.search(request.query_params.get('q', ''), names, projects, limit, offset)
+        return paginator.get_paginated_response(paginator.set_page(results))
+
+
+# Archived projects the user owned or was assigned to, every archived project for admins
+def archived_projects(user):
+    projects = ArchivedProject.objects.select_related('project_owner').order_by('pk')
+    if user.is_staff:
+        return projects
+    return projects.filter(
+        Q(project_owner=user) | Q(pk__in=ArchivedAssignedUser.objects.filter(user=user).values('project')))
+
+
+# Read-only list of archived projects, without their tasks
+class ArchivedProjectList(generics.ListAPIView):
+    serializer_class = ArchivedProjectSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = ProjectPagination
+
+    def get_queryset(self):
+        return archived_projects(self.request.user)
 
 
+class ArchivedProjectDetail(generics.RetrieveAPIView):
+    serializer_class = ArchivedProjectDetailSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return archived_projects(self.request.user).prefetch_related(
+            Prefetch('tasks', queryset=ArchivedTask.objects.select_related('task_owner').order_by('pk')),
+            Prefetch('assigned_users', queryset=ArchivedAssignedUser.objects.select_related('user').order_by('pk')))
+
+
+# Full dump of projects or tasks streamed as NDJSON or CSV, memory use does not depend on the table size
+class Export(APIView):
+    permission_classes = [IsAdminUser]
+    formats = {
+        'ndjson': (ndjson_lines, 'application/x-ndjson'),
+        'csv': (csv_lines, 'text/csv'),
+    }
+
+    def get(self, request, dataset, file_format):
+        if dataset not in DATASETS or file_format not in self.formats:
+            raise Http404
+        lines, content_type = self.formats[file_format]
+        response = StreamingHttpResponse(lines(dataset), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{dataset}.{file_format}"'
+        return response
+
+
+# Per-view request and cache statistics for admins, DELETE resets the view statistics
+class Stats(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'views': view_stats.snapshot(),
+            'auth_token_cache': token_cache.stats(),
+            'response_cache': response_cache.stats(),
+            'event_streams': events.broker.stats(),
+            'database_routing': routing_stats.snapshot(),
+        })
+
+    def delete(self, request):
+        view_stats.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
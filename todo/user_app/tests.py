@@ -1,3 +1,46 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from todo_app import throttling
+from user_app.authentication import token_cache
+
+
+# Token lookups are cached by user_app.authentication, a token that is gone must stop working straight away
+class TokenCacheTests(APITestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        throttling.store().clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.token = self.user.auth_token  # made by user_app.models on registration
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get(self):
+        return self.client.get(reverse('project-list'))
+
+    def test_lookups_are_cached(self):
+        self.assertEqual(self.get().status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get().status_code, 200)
+        self.assertFalse([query for query in queries if 'authtoken_token' in query['sql']])
+
+    def test_logout_drops_the_token(self):
+        self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(self.client.post(reverse('logou')).status_code, 200)
+        self.assertEqual(self.get().status_code, 401)
+
+    def test_deleted_token_and_inactive_user(self):
+        self.assertEqual(self.get().status_code, 200)
+        self.token.delete()
+        self.assertEqual(self.get().status_code, 401)
+
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual(self.get().status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get().status_code, 401)
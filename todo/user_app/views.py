@@ -1,22 +1,31 @@
-from rest_framework.decorators import api_view
+import logging
+
+from rest_framework.decorators import api_view, throttle_classes
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from rest_framework import status
 
 from user_app.serializers import RegistrationSerializer
+from user_app.authentication import token_cache
 from user_app import models
+from todo_app.throttling import RegistrationRateThrottle
+
+logger = logging.getLogger(__name__)
 
 
 @api_view(['POST'])
 def logout_view(request):
     if request.method =='POST':
-        request.user.auth_token.delete()
+        token = request.user.auth_token
+        token.delete()
+        token_cache.invalidate(token.key)  # drop the cached lookup straight away
         return Response(status=status.HTTP_200_OK)
 
 
 
 
 @api_view(['POST'])
+@throttle_classes([RegistrationRateThrottle])
 def registation_view(request):
 
     if request.method == 'POST':
@@ -25,7 +34,7 @@ def registation_view(request):
         data = {}
         if serializer.is_valid():
             account = serializer.save()
-            print(account)
+            logger.info('registered user: username=%s', account.username)
             data['response'] = "Registration Successful"
             data['username'] = account.username
             data['email'] = account.email